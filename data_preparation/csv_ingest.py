@@ -0,0 +1,73 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pv
+
+timestamp_format = "%Y-%m-%d %H:%M:%S"
+string_dictionary = pa.dictionary(pa.int32(), pa.string())
+
+# The strings pandas.read_csv reads as missing; the cleaning notebook writes
+# missing Product and Sales Agent values as "None"
+null_values = [
+    "",
+    "#N/A",
+    "#N/A N/A",
+    "#NA",
+    "-1.#IND",
+    "-1.#QNAN",
+    "-NaN",
+    "-nan",
+    "1.#IND",
+    "1.#QNAN",
+    "<NA>",
+    "N/A",
+    "NA",
+    "NULL",
+    "NaN",
+    "None",
+    "n/a",
+    "nan",
+    "null",
+]
+
+
+def arrow_column_types(category_columns, numeric_dtypes):
+    """
+    Arrow types for the declared pandas schema: dictionary-encoded strings
+    for categoricals and the same narrow numeric types
+    """
+    types = {"Timestamp": pa.timestamp("ns")}
+    types.update({column: string_dictionary for column in category_columns})
+    types.update(
+        {
+            column: pa.from_numpy_dtype(np.dtype(dtype))
+            for column, dtype in numeric_dtypes.items()
+        }
+    )
+    return types
+
+
+def read_csv_arrow(file, column_types, block_size=1 << 24):
+    """
+    Reads a CSV path or file object with Arrow's multi-threaded reader,
+    converting the declared columns straight to their types and parsing
+    Timestamp with a fixed format. Rows with the wrong number of fields
+    are skipped and counted. Returns (DataFrame, skipped rows).
+    """
+    skipped = []
+
+    def skip_row(row):
+        skipped.append(row.number)
+        return "skip"
+
+    table = pv.read_csv(
+        file,
+        read_options=pv.ReadOptions(use_threads=True, block_size=block_size),
+        parse_options=pv.ParseOptions(invalid_row_handler=skip_row),
+        convert_options=pv.ConvertOptions(
+            column_types=column_types,
+            timestamp_parsers=[timestamp_format],
+            null_values=null_values,
+            strings_can_be_null=True,
+        ),
+    )
+    return table.to_pandas(), len(skipped)
@@ -1,15 +1,257 @@
 import streamlit as st
 import pandas as pd
 import calendar
+import os
+import sys
+import time
+import numpy as np
+import pyarrow as pa
 
+from data_preparation.csv_ingest import arrow_column_types, read_csv_arrow
+from data_preparation.data_source import DataSource
+from data_preparation.filter_index import FilterIndex
+from data_preparation.hyperloglog import standard_error
+from data_preparation.metric_cache import normalize_key
+from data_preparation.metrics import Metrics
+from data_preparation.olap_cube import SalesCube
+from data_preparation.session_table import SessionTable
+from data_preparation.visitor_index import VisitorIndex
+from data_preparation.query_backends import create_backend
+from data_preparation.upload_cache import (
+    content_hash,
+    read_cached_frame,
+    write_cached_frame,
+)
 
-@st.cache_data
-def load_data(file):
-    data = pd.read_csv(file, on_bad_lines="skip")
+# Cleaned file or directory served to every session instead of uploads
+data_source_path = os.environ.get("DASHBOARD_DATA")
+# "cube" answers metrics from the in-memory cube; "pandas", "sqlite",
+# "duckdb" and "polars" run them through data_preparation.query_backends
+query_backend = os.environ.get("DASHBOARD_BACKEND", "cube")
+
+# Declared dtypes for the cleaned dataset. Low-cardinality strings become
+# categoricals and numeric columns are narrowed where every value fits;
+# Price and Revenue stay float64 so summed revenue is exact to the cent.
+category_columns = [
+    "Country",
+    "Referrer",
+    "Product",
+    "Sales Agent",
+    "Request Type",
+    "Method",
+    "URL",
+]
+numeric_dtypes = {
+    "hour": "int8",
+    "day_of_week": "int8",
+    "month": "int8",
+    "is_weekend": "int8",
+    "year": "int16",
+    "Status Code": "int16",
+    "pages_after_demo": "int16",
+    "sessions_after_demo": "int16",
+    "Response Time (ms)": "float32",
+    "time_to_purchase": "float32",
+}
+
+
+def compact_session_ids(session_ids):
+    # Session-level groupbys and nunique run much faster on integer keys than
+    # on 36 character uuid strings. String ids are hashed to int64 rather
+    # than factorized so the same id maps to the same key in every file.
+    if pd.api.types.is_integer_dtype(session_ids):
+        return session_ids
+    missing = session_ids.isna().to_numpy()
+    hashed = np.zeros(len(session_ids), dtype=np.uint64)
+    hashed[~missing] = pd.util.hash_array(session_ids[~missing].to_numpy(dtype=object))
+    compact = pd.Series(hashed.view(np.int64), index=session_ids.index)
+    if missing.any():
+        compact = compact.astype("Int64").mask(missing)
+    return compact
+
+
+# Session ID is read as whatever it holds and compacted afterwards
+csv_column_types = arrow_column_types(category_columns, numeric_dtypes)
+
+
+def fits_dtype(values, dtype):
+    if np.issubdtype(np.dtype(dtype), np.floating):
+        return pd.api.types.is_float_dtype(values) or pd.api.types.is_integer_dtype(
+            values
+        )
+    if not pd.api.types.is_integer_dtype(values) or values.isna().any():
+        return False
+    info = np.iinfo(dtype)
+    return values.empty or (values.min() >= info.min and values.max() <= info.max)
+
+
+def apply_schema(data):
+    """
+    Converts the columns named in the declared schema, leaving any column
+    that is missing or does not fit its narrower dtype as it was
+    """
+    for column in category_columns:
+        if column in data.columns:
+            # Sorted categories, whatever order a reader found them in, so
+            # groupbys list values in the same order for every loader
+            values = data[column].astype("category")
+            data[column] = values.cat.reorder_categories(sorted(values.cat.categories))
+    for column, dtype in numeric_dtypes.items():
+        if column in data.columns and fits_dtype(data[column], dtype):
+            data[column] = data[column].astype(dtype)
+    return data
+
+
+def memory_mb(data):
+    return data.memory_usage(deep=True).sum() / 1024**2
+
+
+def inferred_mb(data):
+    """
+    memory_mb of data as pandas.read_csv would have inferred it, for frames
+    read with the schema already applied: Python strings for the
+    categoricals and 64-bit numbers for the narrowed columns
+    """
+    usage = data.memory_usage(deep=True)
+    for column in category_columns:
+        if column in data.columns and isinstance(
+            data[column].dtype, pd.CategoricalDtype
+        ):
+            values = data[column].cat
+            codes = values.codes.to_numpy()
+            counts = np.bincount(codes[codes >= 0], minlength=len(values.categories))
+            sizes = np.array(
+                [sys.getsizeof(value) for value in values.categories], dtype=np.int64
+            )
+            # Missing values are float NaN objects
+            missing = np.count_nonzero(codes < 0) * sys.getsizeof(np.nan)
+            usage[column] = 8 * len(codes) + int(sizes @ counts) + missing
+    for column in numeric_dtypes:
+        if column in data.columns:
+            usage[column] = 8 * len(data)
+    return usage.sum() / 1024**2
+
+
+def prepare_data(data, schema_applied=False):
     data["Timestamp"] = pd.to_datetime(data["Timestamp"])
+    data["Session ID"] = compact_session_ids(data["Session ID"])
+    before = inferred_mb(data) if schema_applied else memory_mb(data)
+    data = apply_schema(data)
+    after = memory_mb(data)
+    data.attrs["memory_mb"] = (float(before), float(after))
+    print(f"Loaded {len(data):,} rows: {before:.1f} MB -> {after:.1f} MB")
+    return data
+
+
+def parse_upload(file):
+    try:
+        data, skipped = read_csv_arrow(file, csv_column_types)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as error:
+        # A value that does not fit the declared schema; read it the slow way
+        print(f"Falling back to pandas for this CSV: {error}")
+        if hasattr(file, "seek"):
+            file.seek(0)
+        return prepare_data(pd.read_csv(file, on_bad_lines="skip"))
+    data = prepare_data(data, schema_applied=True)
+    data.attrs["skipped_rows"] = skipped
+    if skipped:
+        print(f"Skipped {skipped:,} malformed lines")
+    return data
+
+
+def read_dataset_file(path):
+    if path.endswith(".parquet"):
+        return prepare_data(pd.read_parquet(path))
+    if path.endswith((".feather", ".arrow")):
+        return prepare_data(pd.read_feather(path))
+    return parse_upload(path)
+
+
+def load_dataset_file(path):
+    """
+    Returns (digest, data) for one file of a server-side data source,
+    reusing the columnar cache shared with uploads
+    """
+    digest = content_hash(path)
+    data = read_cached_frame(digest)
+    if data is None:
+        data = read_dataset_file(path)
+        write_cached_frame(digest, data)
+    return digest, data
+
+
+def combine_frames(frames):
+    if len(frames) == 1:
+        return frames[0]
+    # Categoricals with different categories concatenate to object columns
+    data = pd.concat(frames, ignore_index=True)
+    before = sum(frame.attrs.get("memory_mb", (0, 0))[0] for frame in frames)
+    data = apply_schema(data)
+    data.attrs["memory_mb"] = (float(before), float(memory_mb(data)))
     return data
 
 
+def upload_digest(file):
+    """
+    content_hash of an upload, computed once per uploaded file in a session
+    rather than on every rerun
+    """
+    file_id = getattr(file, "file_id", None)
+    if file_id is None:
+        return content_hash(file)
+    cached = st.session_state.get("upload_digest")
+    if cached is None or cached[0] != file_id:
+        cached = (file_id, content_hash(file))
+        st.session_state["upload_digest"] = cached
+    return cached[1]
+
+
+@st.cache_resource(max_entries=4)
+def load_cached_data(digest, _file):
+    # Keyed on the content hash alone so Streamlit does not hash the upload
+    # again, and shared rather than copied on every rerun like the server
+    # source; a columnar copy on disk survives server restarts
+    data = read_cached_frame(digest)
+    if data is not None:
+        print(f"Loaded {len(data):,} rows from the upload cache ({digest})")
+        return data
+    data = parse_upload(_file)
+    write_cached_frame(digest, data)
+    return data
+
+
+@st.cache_resource
+def get_data_source(path):
+    source = DataSource(path, load_dataset_file, combine_frames)
+    source.start()
+    return source
+
+
+@st.cache_resource(max_entries=4)
+def load_filter_index(digest, _df):
+    return FilterIndex(_df)
+
+
+@st.cache_resource(max_entries=4)
+def load_sales_cube(digest, _df):
+    return SalesCube(_df)
+
+
+@st.cache_resource(max_entries=4)
+def load_session_table(digest, _df):
+    return SessionTable(_df)
+
+
+@st.cache_resource(max_entries=4)
+def load_visitor_index(digest, _df):
+    return VisitorIndex(_df)
+
+
+@st.cache_resource(max_entries=4)
+def load_query_backend(name, digest, _df):
+    return create_backend(name, _df, digest)
+
+
 def load_and_filter_data():
     with st.sidebar:
         st.logo("image.png")
@@ -22,12 +264,39 @@ def load_and_filter_data():
             unsafe_allow_html=True,
         )
 
-    file = st.sidebar.file_uploader("Choose a dataset")
-    if file is None:
-        st.warning("Please upload a dataset to continue")
-        st.stop()
+    if data_source_path:
+        # One shared copy for every session, swapped whole on reload
+        source = get_data_source(data_source_path)
+        digest, df = source.snapshot
+        st.sidebar.caption(
+            f"Serving {data_source_path}, loaded "
+            f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(source.loaded_at))}"
+        )
+    else:
+        file = st.sidebar.file_uploader("Choose a dataset")
+        if file is None:
+            st.warning("Please upload a dataset to continue")
+            st.stop()
 
-    df = load_data(file)
+        digest = upload_digest(file)
+        df = load_cached_data(digest, file)
+    index = load_filter_index(digest, df)
+    session_table = load_session_table(digest, df)
+    visitor_index = load_visitor_index(digest, df)
+    if query_backend == "cube":
+        cube = load_sales_cube(digest, df)
+        backend = None
+    else:
+        cube = None
+        backend = load_query_backend(query_backend, digest, df)
+    if "memory_mb" in df.attrs:
+        before, after = df.attrs["memory_mb"]
+        caption = f"{len(df):,} rows in memory: {after:.1f} MB"
+        if before > after:
+            caption += f" (was {before:.1f} MB)"
+        if df.attrs.get("skipped_rows"):
+            caption += f", {df.attrs['skipped_rows']:,} malformed lines skipped"
+        st.sidebar.caption(caption)
     st.sidebar.header("Filters")
 
     min_date = df["Timestamp"].min()
@@ -44,10 +313,6 @@ def load_and_filter_data():
         return None, None, None
 
     start_date, end_date = date_range
-    filtered_df = df[
-        (df["Timestamp"] >= pd.to_datetime(start_date))
-        & (df["Timestamp"] <= pd.to_datetime(end_date))
-    ]
 
     country_filter = st.sidebar.selectbox(
         "**Country**", options=["All"] + list(df["Country"].unique()), index=0
@@ -66,49 +331,65 @@ def load_and_filter_data():
     year_filter = st.sidebar.selectbox(
         "**Year**", options=["All"] + list(df["year"].unique()), index=0
     )
+    approximate = False
+    if cube is not None or backend.name == "duckdb":
+        approximate = st.sidebar.toggle(
+            "Approximate unique counts",
+            help=(
+                "Counts visitors and sessions from HyperLogLog sketches "
+                "instead of exactly"
+            ),
+        )
+    if approximate and cube is not None:
+        error = standard_error(cube.precision)
+        st.sidebar.caption(
+            f"Total visitors, session counts and weekly traffic are estimates: "
+            f"standard error {error:.2%}, 95% of counts within ±{2 * error:.2%}. "
+            "New and returning visitors and hourly traffic stay exact."
+        )
+    elif approximate:
+        st.sidebar.caption(
+            "Total visitors, session counts and weekly traffic are estimates from "
+            "DuckDB's approx_count_distinct. New and returning visitors and hourly "
+            "traffic stay exact."
+        )
 
-    if country_filter != "All":
-        filtered_df = filtered_df[filtered_df["Country"] == country_filter]
-    if product_filter != "All":
-        filtered_df = filtered_df[
-            filtered_df["Product"].notna() & (filtered_df["Product"] == product_filter)
+    # The date range covers whole days, end date included
+    start_time = pd.to_datetime(start_date)
+    end_time = pd.to_datetime(end_date) + pd.Timedelta(days=1)
+    selection = {
+        column: None if value == "All" else value
+        for column, value in [
+            ("Country", country_filter),
+            ("Product", product_filter),
+            ("month", month_name_to_num.get(month_filter)),
+            ("year", year_filter),
         ]
-    if month_filter != "All":
-        selected_month_num = month_name_to_num[month_filter]
-        filtered_df = filtered_df[filtered_df["month"] == selected_month_num]
-    if year_filter != "All":
-        filtered_df = filtered_df[filtered_df["year"] == year_filter]
-
-    filters = {
-        "product_sales": filtered_df.groupby("Product", as_index=False)["Revenue"]
-        .sum()
-        .sort_values(by="Revenue", ascending=False),
-        "sales_by_country": filtered_df.groupby("Country")["Revenue"]
-        .sum()
-        .reset_index()
-        .sort_values(by="Revenue", ascending=False),
-        "product_sales_by_agent": filtered_df.groupby("Sales Agent")["Revenue"]
-        .sum()
-        .reset_index(),
-        "conversion_by_referrer": filtered_df.groupby("Referrer").agg(
-            {"Session ID": "nunique", "Product": lambda x: x.notnull().sum()}
-        ),
-        "monthly_sessions": filtered_df.groupby("month")["Session ID"].nunique(),
-        "total_sales": filtered_df[
-            filtered_df["Request Type"] == "Product Purchase"
-        ].shape[0],
-        "total_sales_revenue": filtered_df["Revenue"].sum(),
-        "total_visitors": filtered_df["IP Address"].nunique(),
-        "conversion_by_IP": filtered_df[filtered_df["Product"].notna()][
-            "IP Address"
-        ].nunique(),
-        "month_filter": month_filter,
-        "start_date": start_date,
-        "end_date": end_date,
-        "df": df,
     }
-    filters["conversion_rate"] = (
-        filters["conversion_by_IP"] / filters["total_visitors"]
-    ) * 100
+
+    # Metrics are computed when a renderer first asks for them and memoized
+    # per dataset, filter combination and metric name
+    filters = Metrics(
+        index,
+        cube,
+        start_time,
+        end_time,
+        selection,
+        approximate,
+        inputs={
+            "month_filter": month_filter,
+            "start_date": start_date,
+            "end_date": end_date,
+            "approximate": approximate,
+        },
+        key=normalize_key(
+            (digest, query_backend, start_time, end_time, selection, bool(approximate))
+        ),
+        backend=backend,
+        frame=df,
+        sessions=session_table,
+        visitors=visitor_index,
+    )
+    filtered_df = df.take(filters["rows"])
 
     return df, filtered_df, filters
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+filter_dimensions = ["Country", "Product", "month", "year"]
+
+
+def value_positions(values):
+    """
+    Maps every distinct non-null value to the ascending positions where it
+    occurs, as views into a single stable argsort of the factorized codes
+    """
+    codes, uniques = pd.factorize(values)
+    perm = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    bounds = np.count_nonzero(codes < 0) + np.concatenate(([0], np.cumsum(counts)))
+    return {value: perm[bounds[i] : bounds[i + 1]] for i, value in enumerate(uniques)}
+
+
+def contains_sorted(haystack, needles):
+    idx = np.searchsorted(haystack, needles)
+    found = idx < len(haystack)
+    found[found] = haystack[idx[found]] == needles[found]
+    return found
+
+
+class FilterIndex:
+    """
+    Row indexes built once per dataset so the sidebar filters never scan the
+    full frame. Rows are ranked by Timestamp; a date range is a contiguous
+    block of ranks found with searchsorted, and each filter value keeps the
+    sorted ranks it occurs at. A selection is the intersection of those rank
+    arrays, clipped to the date block, mapped back to row positions.
+    """
+
+    def __init__(self, df, dimensions=filter_dimensions):
+        self.order = np.argsort(df["Timestamp"].to_numpy(), kind="stable")
+        self.timestamps = df["Timestamp"].to_numpy()[self.order]
+        self.values = {
+            column: value_positions(df[column].take(self.order).to_numpy())
+            for column in dimensions
+            if column in df.columns
+        }
+
+    def date_block(self, start=None, end=None):
+        lo = (
+            0
+            if start is None
+            else np.searchsorted(self.timestamps, np.datetime64(start), "left")
+        )
+        hi = (
+            len(self.timestamps)
+            if end is None
+            else np.searchsorted(self.timestamps, np.datetime64(end), "left")
+        )
+        return int(lo), int(max(hi, lo))
+
+    def select(self, start=None, end=None, **values):
+        """
+        Returns the row positions, in Timestamp order, with start <= Timestamp
+        < end and column == value for every column=value given. Values of
+        None mean no filter on that column.
+        """
+        lo, hi = self.date_block(start, end)
+        selected = []
+        for column, value in values.items():
+            if value is None:
+                continue
+            ranks = self.values[column].get(value, np.empty(0, dtype=np.int64))
+            a, b = np.searchsorted(ranks, [lo, hi])
+            selected.append(ranks[a:b])
+
+        if not selected:
+            return self.order[lo:hi]
+        # Probe the smaller arrays against each other, smallest first
+        selected.sort(key=len)
+        ranks = selected[0]
+        for other in selected[1:]:
+            ranks = ranks[contains_sorted(other, ranks)]
+        return self.order[ranks]
@@ -0,0 +1,45 @@
+"""
+Vectorized HyperLogLog helpers. A sketch is an array of 2**p uint8
+registers; sketches merge by taking the elementwise maximum, and a set of
+sketches can be stacked along the first axis and estimated in one call.
+"""
+
+import numpy as np
+import pandas as pd
+
+hll_precision = 14
+
+
+def standard_error(p=hll_precision):
+    return 1.04 / np.sqrt(2**p)
+
+
+def register_updates(values, p=hll_precision):
+    """
+    Hashes every value once and returns, per value, the register it lands in
+    and the rank (position of the first set bit) it offers that register.
+    Missing values are dropped, so also returns the mask of values kept.
+    """
+    values = pd.Series(values)
+    present = values.notna().to_numpy()
+    hashes = pd.util.hash_array(values[present].to_numpy())
+    index = (hashes >> np.uint64(64 - p)).astype(np.uint32)
+    # The low 64 - p bits are exact as float64, so frexp gives their length
+    rest = (hashes & np.uint64((1 << (64 - p)) - 1)).astype(np.float64)
+    rank = (64 - p + 1 - np.frexp(rest)[1]).astype(np.uint8)
+    return index, rank, present
+
+
+def estimate(registers):
+    """
+    Cardinality estimate for the sketch in the last axis of registers, with
+    linear counting for small cardinalities
+    """
+    registers = np.asarray(registers)
+    m = registers.shape[-1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int32)), axis=-1)
+    zeros = np.count_nonzero(registers == 0, axis=-1)
+    small = (raw <= 2.5 * m) & (zeros > 0)
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where(small, linear, raw)
@@ -0,0 +1,90 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+metric_cache_bytes = 256 * 1024**2
+
+
+def sizeof(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    return sys.getsizeof(value)
+
+
+def normalize_key(value):
+    """
+    Turns widget values into plain hashable Python values, so numpy scalars
+    and their Python equivalents give the same key
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((k, normalize_key(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize_key(v) for v in value)
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value
+
+
+class MetricCache:
+    """
+    Process-wide LRU of computed aggregates keyed by (dataset fingerprint,
+    filter tuple, metric name). Streamlit never hashes the inputs; each
+    entry is sized when stored and the least recently used entries are
+    dropped once the total passes max_bytes. Values are shared between
+    sessions and must not be modified by callers.
+    """
+
+    def __init__(self, max_bytes=metric_cache_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        size = sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return (
+            f"MetricCache(entries={len(self.entries)}, "
+            f"bytes={self.total_bytes:,}/{self.max_bytes:,}, "
+            f"hits={self.hits}, misses={self.misses})"
+        )
+
+
+metric_cache = MetricCache()
@@ -0,0 +1,323 @@
+"""
+Registry of the dashboard's named metrics. Each metric is a function of the
+filter state and of the metrics it declares as dependencies; nothing is
+computed until a renderer asks for it, and a result is then kept for the
+rest of the rerun and in the shared metric cache.
+"""
+
+import calendar
+
+import numpy as np
+import pandas as pd
+
+from data_preparation.metric_cache import metric_cache, normalize_key
+from data_preparation.visitor_index import first_seen_in
+
+registry = {}
+
+
+def metric(name, depends=()):
+    def register(func):
+        registry[name] = (func, tuple(depends))
+        return func
+
+    return register
+
+
+class Metrics:
+    """
+    Lazy, read-only mapping from metric name to value for one filter state.
+    inputs are plain values handed through as they are, such as the raw
+    widget selections; frame is the full dataset, for metrics the cube
+    cannot answer, sessions its SessionTable and visitors its VisitorIndex.
+    key identifies the dataset and filter state in the shared cache;
+    without one results only live for this object. With a query backend,
+    the metrics it implements are computed by it instead of from the cube.
+    """
+
+    def __init__(
+        self,
+        index,
+        cube,
+        start=None,
+        end=None,
+        selection=None,
+        approximate=False,
+        inputs=None,
+        key=None,
+        cache=metric_cache,
+        backend=None,
+        frame=None,
+        sessions=None,
+        visitors=None,
+    ):
+        self.index = index
+        self.cube = cube
+        self.start = start
+        self.end = end
+        self.selection = selection or {}
+        self.approximate = approximate
+        self.inputs = inputs or {}
+        self.key = key
+        self.cache = cache
+        self.backend = backend
+        self.frame = frame
+        self.sessions = sessions
+        self.visitors = visitors
+        self.values = {}
+
+    def __getitem__(self, name):
+        if name in self.inputs:
+            return self.inputs[name]
+        if name not in self.values:
+            func, depends = registry[name]
+
+            def compute():
+                if self.backend is not None and name in self.backend.metrics:
+                    return self.backend.compute(
+                        name, self.start, self.end, self.selection, self.approximate
+                    )
+                return func(self, *[self[dependency] for dependency in depends])
+
+            if self.key is None:
+                self.values[name] = compute()
+            else:
+                self.values[name] = self.cache.get_or_compute(
+                    self.key + (name,), compute
+                )
+        return self.values[name]
+
+    def period(self, start=None, end=None, selection=None):
+        """
+        The same metrics over another filter state of the same dataset, such
+        as the periods the overview cards compare
+        """
+        key = None
+        if self.key is not None:
+            key = self.key + ("period",) + normalize_key((start, end, selection or {}))
+        return Metrics(
+            self.index,
+            self.cube,
+            start,
+            end,
+            selection,
+            self.approximate,
+            key=key,
+            cache=self.cache,
+            backend=self.backend,
+            frame=self.frame,
+            sessions=self.sessions,
+            visitors=self.visitors,
+        )
+
+    def __contains__(self, name):
+        return name in self.inputs or name in registry
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def computed(self):
+        return list(self.values)
+
+
+def day_table(visitors):
+    """
+    Visitors per day of week (0 is Monday) as the Day/Visitors table the
+    weekly traffic chart plots, in calendar order
+    """
+    table = pd.DataFrame(
+        {
+            "Day": pd.Categorical(
+                [calendar.day_name[day] for day in visitors.index],
+                categories=list(calendar.day_name),
+                ordered=True,
+            ),
+            "Visitors": visitors.to_numpy(),
+        }
+    )
+    return table.sort_values("Day", ignore_index=True)
+
+
+def hour_table(visitors):
+    return pd.DataFrame(
+        {"hour": visitors.index.to_numpy(), "visitors": visitors.to_numpy()}
+    )
+
+
+funnel_stages = ["Demo Request", "Product Purchase"]
+
+
+def funnel_table(products, request_types, counts=1):
+    """
+    Events per product at each funnel stage, one row per product given, as
+    the Product/Demo Request/Product Purchase table the funnel chart melts
+    """
+    request_types = np.asarray(request_types, dtype=object)
+    table = pd.DataFrame(
+        {stage: np.where(request_types == stage, counts, 0) for stage in funnel_stages},
+        index=products.index,
+    )
+    return table.groupby(products, observed=True).sum().reset_index()
+
+
+@metric("rows")
+def selected_rows(m):
+    return m.index.select(m.start, m.end, **m.selection)
+
+
+@metric("cells")
+def selected_cells(m):
+    return m.cube.select(m.start, m.end, **m.selection)
+
+
+@metric("sold", depends=["cells"])
+def sold_cells(m, cells):
+    return cells & m.cube.cells["Product"].notna().to_numpy()
+
+
+@metric("purchases", depends=["cells"])
+def purchase_cells(m, cells):
+    return cells & (m.cube.cells["Request Type"] == "Product Purchase").to_numpy()
+
+
+@metric("product_sales", depends=["cells"])
+def product_sales(m, cells):
+    return (
+        m.cube.rollup(cells, "Product")
+        .reset_index()
+        .sort_values(by="Revenue", ascending=False)
+    )
+
+
+@metric("sales_by_country", depends=["cells"])
+def sales_by_country(m, cells):
+    return (
+        m.cube.rollup(cells, "Country")
+        .reset_index()
+        .sort_values(by="Revenue", ascending=False)
+    )
+
+
+@metric("product_sales_by_agent", depends=["cells"])
+def product_sales_by_agent(m, cells):
+    return m.cube.rollup(cells, "Sales Agent").reset_index()
+
+
+@metric("conversion_by_referrer", depends=["cells", "sold"])
+def conversion_by_referrer(m, cells, sold):
+    conversions = m.cube.distinct(cells, "Session ID", "Referrer", m.approximate)
+    conversions = conversions.to_frame("Session ID")
+    conversions["Product"] = m.cube.rollup(sold, "Referrer", "events").reindex(
+        conversions.index, fill_value=0
+    )
+    return conversions
+
+
+@metric("monthly_sessions", depends=["cells"])
+def monthly_sessions(m, cells):
+    return m.cube.distinct(cells, "Session ID", "month", m.approximate)
+
+
+@metric("product_funnel", depends=["sold"])
+def product_funnel(m, sold):
+    cells = m.cube.cells[sold]
+    return funnel_table(
+        cells["Product"], cells["Request Type"], cells["events"].to_numpy()
+    )
+
+
+@metric("sales_volume_by_country", depends=["sold", "purchases"])
+def sales_volume_by_country(m, sold, purchases):
+    return (
+        m.cube.rollup(sold & purchases, "Country", "events")
+        .rename("Sales Made")
+        .reset_index()
+    )
+
+
+@metric("total_sales", depends=["purchases"])
+def total_sales(m, purchases):
+    return int(m.cube.cells["events"][purchases].sum())
+
+
+@metric("total_sales_revenue", depends=["cells"])
+def total_sales_revenue(m, cells):
+    return m.cube.cells["Revenue"][cells].sum()
+
+
+@metric("total_visitors", depends=["cells"])
+def total_visitors(m, cells):
+    return m.cube.distinct(cells, "IP Address", approximate=m.approximate)
+
+
+@metric("conversion_by_IP", depends=["sold"])
+def conversion_by_ip(m, sold):
+    return m.cube.distinct(sold, "IP Address", approximate=m.approximate)
+
+
+@metric("conversion_rate", depends=["conversion_by_IP", "total_visitors"])
+def conversion_rate(m, converted, visitors):
+    return converted / visitors * 100 if visitors else 0
+
+
+@metric("visitors_by_day", depends=["cells"])
+def visitors_by_day(m, cells):
+    # From the cube, so it follows the approximate toggle like the totals;
+    # every query backend answers it itself
+    return day_table(m.cube.distinct(cells, "IP Address", "day_of_week", m.approximate))
+
+
+@metric("visitors_by_hour", depends=["rows"])
+def visitors_by_hour(m, rows):
+    hours = m.frame["hour"].to_numpy()[rows]
+    return hour_table(m.frame["IP Address"].take(rows).groupby(hours).nunique())
+
+
+@metric("sessions", depends=["rows"])
+def selected_sessions(m, rows):
+    return m.sessions.select(rows)
+
+
+@metric("avg_session_duration", depends=["sessions"])
+def avg_session_duration(m, sessions):
+    return sessions["duration"].mean() if len(sessions) else 0
+
+
+@metric("visitor_first_seen", depends=["rows"])
+def visitor_first_seen(m, rows):
+    return m.visitors.select(rows)
+
+
+@metric("new_first_seen", depends=["visitor_first_seen"])
+def new_first_seen(m, first_seen):
+    # New visitors were first seen inside the selected period: the date
+    # range and, when chosen, the month and year
+    return first_seen_in(
+        first_seen, m.start, m.end, m.selection.get("month"), m.selection.get("year")
+    )
+
+
+@metric("new_visitors", depends=["new_first_seen"])
+def new_visitors(m, new):
+    return len(new)
+
+
+@metric("returning_visitors", depends=["visitor_first_seen", "new_visitors"])
+def returning_visitors(m, first_seen, new):
+    return len(first_seen) - new
+
+
+@metric("visitors_by_month", depends=["rows", "new_first_seen"])
+def visitors_by_month(m, rows, new):
+    months = m.frame["month"].to_numpy()[rows]
+    visitors = m.frame["IP Address"].take(rows).groupby(months).nunique()
+    # Each new visitor counts once, in the month they were first seen
+    new = pd.Series(pd.DatetimeIndex(new).month).value_counts()
+    index = visitors.index.union(new.index)
+    return pd.DataFrame(
+        {
+            "month": index.to_numpy(),
+            "total_visitors": visitors.reindex(index, fill_value=0).to_numpy(),
+            "new_users": new.reindex(index, fill_value=0).to_numpy(),
+        }
+    )
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+from data_preparation.hyperloglog import estimate, hll_precision, register_updates
+
+cube_dimensions = ["Country", "Product", "Sales Agent", "Referrer", "Request Type"]
+distinct_columns = ["IP Address", "Session ID"]
+
+
+class SalesCube:
+    """
+    Revenue sums and event counts pre-aggregated per (date, Country, Product,
+    Sales Agent, Referrer, Request Type) cell, built once per dataset. Any
+    combination of the sidebar filters is a mask over the cells, and every
+    grouped total is a rollup of the masked cells, so the cost follows the
+    number of cells rather than the number of rows.
+
+    Distinct counts cannot be added up across cells, so for IP Address and
+    Session ID the cube keeps the distinct (cell, key) pairs as well. The
+    pairs of the selected cells are merged by a union over their keys.
+    For the approximate mode each cell also keeps a sparse HyperLogLog
+    sketch, the (register, rank) entries its rows set, which merge by
+    taking the maximum rank per register.
+    """
+
+    def __init__(
+        self,
+        df,
+        dimensions=cube_dimensions,
+        distinct=distinct_columns,
+        precision=hll_precision,
+    ):
+        self.dimensions = dimensions
+        self.precision = precision
+        keys = [df["Timestamp"].dt.normalize().rename("date")] + [
+            df[c] for c in dimensions
+        ]
+        groups = df.groupby(keys, observed=True, dropna=False, sort=False)
+        cell = groups.ngroup().to_numpy()
+        self.cells = groups.agg(
+            Revenue=("Revenue", "sum"), events=("Revenue", "size")
+        ).reset_index()
+        for part in ["month", "year", "day_of_week"]:
+            values = getattr(self.cells["date"].dt, part)
+            self.cells[part] = values.astype(df[part].dtype) if part in df else values
+
+        self.pairs = {}
+        for column in distinct:
+            codes, uniques = pd.factorize(df[column])
+            present = codes >= 0
+            combined = np.unique(
+                cell[present].astype(np.int64) * len(uniques) + codes[present]
+            )
+            self.pairs[column] = (
+                combined // len(uniques),
+                combined % len(uniques),
+                len(uniques),
+            )
+
+        self.sketches = {}
+        for column in distinct:
+            index, rank, present = register_updates(df[column], precision)
+            best = (
+                pd.Series(rank)
+                .groupby((cell[present].astype(np.int64) << precision) | index)
+                .max()
+            )
+            keys = best.index.to_numpy()
+            self.sketches[column] = (
+                keys >> precision,
+                keys & ((1 << precision) - 1),
+                best.to_numpy(),
+            )
+
+    def select(self, start=None, end=None, **values):
+        """
+        Boolean mask over the cells with start <= date < end and column ==
+        value for every column=value given; None means no filter
+        """
+        cells = self.cells
+        mask = np.ones(len(cells), dtype=bool)
+        if start is not None:
+            mask &= (cells["date"] >= start).to_numpy()
+        if end is not None:
+            mask &= (cells["date"] < end).to_numpy()
+        for column, value in values.items():
+            if value is not None:
+                mask &= (cells[column] == value).to_numpy()
+        return mask
+
+    def rollup(self, mask, by, column="Revenue"):
+        return (
+            self.cells.loc[mask, [by, column]].groupby(by, observed=True)[column].sum()
+        )
+
+    def distinct(self, mask, column, by=None, approximate=False):
+        """
+        Number of distinct values of column over the selected cells, or a
+        Series of them per value of by. With approximate the counts are
+        HyperLogLog estimates merged from the cell sketches.
+        """
+        if approximate:
+            entry_cell, key, rank = self.sketches[column]
+            size = 1 << self.precision
+        else:
+            entry_cell, key, size = self.pairs[column]
+            rank = None
+        chosen = mask[entry_cell]
+        key = key[chosen]
+        rank = None if rank is None else rank[chosen]
+        if by is None:
+            group = np.zeros(len(key), dtype=np.int64)
+            return int(count_keys(1, group, key, rank, size)[0])
+
+        codes, groups = pd.factorize(self.cells[by], sort=True)
+        group = codes[entry_cell[chosen]]
+        present = group >= 0
+        key = key[present]
+        rank = None if rank is None else rank[present]
+        counts = count_keys(len(groups), group[present], key, rank, size)
+        # Groups with selected cells, as groupby(by, observed=True) keeps them
+        selected = np.bincount(codes[mask & (codes >= 0)], minlength=len(groups)) > 0
+        return pd.Series(
+            counts[selected], index=pd.Index(groups[selected], name=by), name=column
+        )
+
+
+def count_keys(groups, group, key, rank, size):
+    """
+    Distinct keys per group: a bitmap union when rank is None, otherwise a
+    HyperLogLog register merge and estimate
+    """
+    if rank is None:
+        seen = np.zeros((groups, size), dtype=bool)
+        seen[group, key] = True
+        return seen.sum(axis=1)
+    registers = np.zeros((groups, size), dtype=np.uint8)
+    np.maximum.at(registers, (group, key), rank)
+    return np.rint(estimate(registers)).astype(np.int64)
@@ -0,0 +1,580 @@
+"""
+Scriptable version of the cleaning steps in Preprocessing.ipynb.
+
+    python -m data_preparation.pipeline \
+        --input data/raw_logs/final_server_logs12.csv \
+        --output data/cleaned_logs/cleaned12.csv
+
+Every step is vectorized: URLs and referrers are processed once per
+distinct value, outliers are capped with np.where and calendar parts come
+from the datetime accessors. The time spent in each stage is reported.
+"""
+
+import argparse
+import glob
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from data_preparation.quantile_sketch import QuantileSketch
+from data_preparation.url_catalog import categorize_urls
+
+REFERRER_PATTERN = r"https?://www\.([a-z]+)\.com"
+
+# Stored as dictionaries in columnar output
+categorical_columns = [
+    "Country",
+    "Method",
+    "URL",
+    "Sales Agent",
+    "Referrer",
+    "Product",
+    "Request Type",
+]
+
+
+def read_partitioned_logs(path):
+    """
+    Reads a partitioned parquet or arrow dataset written by script.py,
+    without the year/month partition columns
+    """
+    fmt = (
+        "arrow"
+        if any(f.endswith(".arrow") for _, _, fs in os.walk(path) for f in fs)
+        else "parquet"
+    )
+    df = ds.dataset(path, format=fmt, partitioning="hive").to_table().to_pandas()
+    return df.drop(columns=["year", "month"], errors="ignore")
+
+
+def read_raw_logs(path):
+    if os.path.isdir(path):
+        df = read_partitioned_logs(path)
+        for column in df.columns:
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype(object)
+        return df
+    return pd.read_csv(path, on_bad_lines="skip")
+
+
+def impute_missing(df, parameters):
+    for column in df.columns:
+        if df[column].dtype == "object":
+            df[column] = df[column].fillna("None")
+        else:
+            df[column] = df[column].fillna(0)
+    return df
+
+
+def response_time_parameters(df):
+    """
+    The global statistics the cleaning depends on: the median used to fill
+    unparseable values, the IQR fences and the 95th percentile cap
+    """
+    response_times = pd.to_numeric(df["Response Time (ms)"], errors="coerce")
+    median = response_times.median()
+    q1, q3, cap_value = (
+        response_times.fillna(median).quantile([0.25, 0.75, 0.95]).to_numpy()
+    )
+    iqr = q3 - q1
+    return {
+        "median": float(median),
+        "q1": float(q1),
+        "lower_bound": float(q1 - 1.5 * iqr),
+        "upper_bound": float(q3 + 1.5 * iqr),
+        "cap_value": float(cap_value),
+    }
+
+
+def apply_response_time_bounds(df, parameters):
+    # Above the IQR fence -> 95th percentile, below it -> Q1
+    response_times = (
+        pd.to_numeric(df["Response Time (ms)"], errors="coerce")
+        .fillna(parameters["median"])
+        .to_numpy()
+    )
+    df["Response Time (ms)"] = np.where(
+        response_times > parameters["upper_bound"],
+        parameters["cap_value"],
+        np.where(
+            response_times < parameters["lower_bound"], parameters["q1"], response_times
+        ),
+    )
+    return df
+
+
+def cap_response_times(df, parameters):
+    # Fitted on df unless the caller pinned the parameters of an earlier run
+    if "cap_value" not in parameters:
+        parameters.update(response_time_parameters(df))
+    return apply_response_time_bounds(df, parameters)
+
+
+def add_time_parts(df, parameters):
+    df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+    timestamps = df["Timestamp"].dt
+    df["hour"] = timestamps.hour
+    df["day_of_week"] = timestamps.day_of_week
+    df["month"] = timestamps.month
+    df["year"] = timestamps.year
+    df["is_weekend"] = (df["day_of_week"] >= 5).astype(np.int64)
+    return df
+
+
+def normalize_referrers(df, parameters):
+    # Extract the site name once per distinct referrer
+    codes, uniques = pd.factorize(df["Referrer"], use_na_sentinel=False)
+    names = (
+        pd.Series(uniques, dtype=object)
+        .str.extract(REFERRER_PATTERN, expand=False)
+        .fillna("direct")
+    )
+    df["Referrer"] = names.to_numpy(dtype=object)[codes]
+    return df
+
+
+def add_revenue(df, parameters):
+    df["Revenue"] = df["Price"]
+    for column in ["Sales Agent", "Product"]:
+        df[column] = df[column].fillna("None")
+    df["Revenue"] = df["Revenue"].fillna(0)
+    return df
+
+
+def categorize_requests(df, parameters):
+    df["Request Type"] = categorize_urls(df["URL"])
+    return df
+
+
+stages = [
+    ("impute missing values", impute_missing),
+    ("cap response time outliers", cap_response_times),
+    ("break up timestamp", add_time_parts),
+    ("isolate referrer names", normalize_referrers),
+    ("add revenue", add_revenue),
+    ("categorize requests", categorize_requests),
+]
+
+
+def clean_logs(df, timings=None, parameters=None):
+    """
+    Runs every stage on df. parameters holds the fitted response time
+    statistics: pass a filled dict to reuse them, or an empty one to get
+    them back.
+    """
+    if parameters is None:
+        parameters = {}
+    for name, stage in stages:
+        started = time.perf_counter()
+        df = stage(df, parameters)
+        if timings is not None:
+            timings.append((name, time.perf_counter() - started))
+    return df
+
+
+def to_columnar(df):
+    """
+    Matches what load_cached_data sees after parsing the cleaned CSV: the "None"
+    placeholders become nulls, and repeated strings become dictionaries
+    """
+    df = df.copy()
+    for column in df.columns:
+        if df[column].dtype == "object":
+            df[column] = df[column].mask(df[column] == "None")
+    for column in categorical_columns:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def write_cleaned_logs(df, path, output_format="csv"):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if output_format == "csv":
+        df.to_csv(path, index=False)
+    elif output_format == "parquet":
+        pq.write_table(to_columnar(df), path)
+    elif output_format == "feather":
+        feather.write_feather(to_columnar(df), path)
+    else:
+        raise ValueError(f"Unknown output format: {output_format}")
+
+
+def run_pipeline(input_path, output_path, output_format="csv"):
+    timings = []
+
+    started = time.perf_counter()
+    df = read_raw_logs(input_path)
+    timings.append(("read raw logs", time.perf_counter() - started))
+
+    df = clean_logs(df, timings)
+
+    started = time.perf_counter()
+    write_cleaned_logs(df, output_path, output_format)
+    timings.append(("write cleaned logs", time.perf_counter() - started))
+    return df, timings
+
+
+# ---------------------------------------------------------------------------
+# Incremental mode
+#
+# Raw logs are append-only, so the manifest remembers how far into each raw
+# CSV the cleaned store already goes. A run only reads the bytes after that
+# offset, cleans them and appends them to the store. The response time
+# parameters are versioned in the manifest: new rows keep being cleaned with
+# the current version, so rows cleaned earlier stay consistent with new
+# ones, until --refresh-parameters fits a new version.
+# ---------------------------------------------------------------------------
+
+
+def default_manifest_path(output_path):
+    return f"{output_path}.manifest.json"
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {"files": {}, "parameters": [], "batches": [], "raw_dtypes": None}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path):
+    # Written to a temporary file first so a crash never leaves half a manifest
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def raw_log_files(input_path):
+    if os.path.isdir(input_path):
+        return sorted(glob.glob(os.path.join(input_path, "*.csv")))
+    return [input_path]
+
+
+def pinned_dtypes(raw_dtypes):
+    # Keeps string and float columns typed as in the first batch, so a batch
+    # where e.g. Product is all empty is still imputed with "None", not 0
+    if raw_dtypes is None:
+        return None
+    return {
+        column: dtype
+        for column, dtype in raw_dtypes.items()
+        if dtype in ("object", "float64")
+    }
+
+
+def read_new_rows(path, entry, dtypes=None):
+    """
+    Reads the complete lines of path after the offset recorded in entry.
+    Returns the rows, the offset to record next and the header line.
+    """
+    with open(path, "rb") as f:
+        if entry is None:
+            header = f.readline()
+            offset = f.tell()
+        else:
+            header = entry["header"].encode()
+            offset = entry["offset"]
+            if os.path.getsize(path) < offset:
+                raise ValueError(
+                    f"{path} is shorter than when it was last processed; "
+                    "rebuild the cleaned store without --incremental"
+                )
+        f.seek(offset)
+        data = f.read()
+
+    # A writer may be mid-line: leave a trailing partial line for next time
+    data = data[: data.rfind(b"\n") + 1]
+    if not data:
+        return None, offset, header.decode()
+    df = pd.read_csv(io.BytesIO(header + data), on_bad_lines="skip", dtype=dtypes)
+    return df, offset + len(data), header.decode()
+
+
+def append_cleaned_logs(df, output_path, output_format, part):
+    if output_format == "csv":
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        new_file = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+        with open(output_path, "a", newline="") as f:
+            df.to_csv(f, index=False, header=new_file)
+    else:
+        # Columnar stores are a directory with one file per increment
+        path = os.path.join(output_path, f"part-{part:05d}.{output_format}")
+        write_cleaned_logs(df, path, output_format)
+
+
+def run_incremental(
+    input_path,
+    output_path,
+    output_format="csv",
+    manifest_path=None,
+    refresh_parameters=False,
+):
+    manifest_path = manifest_path or default_manifest_path(output_path)
+    manifest = load_manifest(manifest_path)
+    timings = []
+    total_rows = 0
+
+    for path in raw_log_files(input_path):
+        key = os.path.abspath(path)
+        entry = manifest["files"].get(key)
+
+        started = time.perf_counter()
+        df, offset, header = read_new_rows(
+            path, entry, pinned_dtypes(manifest["raw_dtypes"])
+        )
+        timings.append(
+            (f"read {os.path.basename(path)}", time.perf_counter() - started)
+        )
+        if df is None or df.empty:
+            continue
+        if manifest["raw_dtypes"] is None:
+            manifest["raw_dtypes"] = {c: str(t) for c, t in df.dtypes.items()}
+
+        # Reuse the current parameter version unless asked to refit
+        if refresh_parameters or not manifest["parameters"]:
+            parameters = {}
+        else:
+            parameters = dict(manifest["parameters"][-1]["values"])
+        df = clean_logs(df, timings, parameters)
+        if refresh_parameters or not manifest["parameters"]:
+            manifest["parameters"].append(
+                {
+                    "version": len(manifest["parameters"]) + 1,
+                    "fitted_on": path,
+                    "created": datetime.now().isoformat(timespec="seconds"),
+                    "values": parameters,
+                }
+            )
+            refresh_parameters = False
+
+        started = time.perf_counter()
+        append_cleaned_logs(df, output_path, output_format, len(manifest["batches"]))
+        timings.append(("append cleaned logs", time.perf_counter() - started))
+
+        manifest["batches"].append(
+            {
+                "file": key,
+                "start_offset": entry["offset"] if entry else len(header.encode()),
+                "end_offset": offset,
+                "rows": len(df),
+                "parameters_version": manifest["parameters"][-1]["version"],
+            }
+        )
+        manifest["files"][key] = {
+            "offset": offset,
+            "rows": (entry["rows"] if entry else 0) + len(df),
+            "header": header,
+        }
+        # Saved after every file so an interrupted run resumes where it stopped
+        save_manifest(manifest, manifest_path)
+        total_rows += len(df)
+
+    return total_rows, timings
+
+
+# ---------------------------------------------------------------------------
+# Chunked (out-of-core) mode
+#
+# Pass 1 streams the raw CSV once and feeds Response Time into a mergeable
+# quantile sketch; pass 2 streams it again and cleans chunk by chunk with
+# the sketched parameters. Memory depends on the chunk size and the sketch
+# size, not on the input size.
+# ---------------------------------------------------------------------------
+
+
+def merge_dtypes(seen, chunk):
+    # A column that is a string in any chunk is read as a string everywhere
+    for column, dtype in chunk.dtypes.items():
+        dtype = str(dtype)
+        previous = seen.get(column)
+        if previous == "object" or dtype == "object":
+            seen[column] = "object"
+        elif previous == "float64" or dtype == "float64":
+            seen[column] = "float64"
+        else:
+            seen[column] = dtype
+    return seen
+
+
+def scan_response_times(input_path, chunk_size, k=2048):
+    sketch = QuantileSketch(k)
+    missing = 0
+    dtypes = {}
+    rows = 0
+    for chunk in pd.read_csv(input_path, on_bad_lines="skip", chunksize=chunk_size):
+        merge_dtypes(dtypes, chunk)
+        response_times = pd.to_numeric(chunk["Response Time (ms)"], errors="coerce")
+        missing += int(response_times.isna().sum())
+        sketch.update(response_times.to_numpy())
+        rows += len(chunk)
+    return sketch, missing, dtypes, rows
+
+
+def sketch_parameters(sketch, missing, numeric):
+    """
+    Same parameters as response_time_parameters, read off the sketch. Gaps
+    are filled the way the cleaning stages fill them: with 0 by
+    impute_missing when the column is numeric, otherwise with the median.
+    """
+    if numeric:
+        sketch.add(0.0, missing)
+        median = sketch.quantile(0.5)
+    else:
+        median = sketch.quantile(0.5)
+        sketch.add(median, missing)
+    q1, q3, cap_value = sketch.quantiles([0.25, 0.75, 0.95])
+    iqr = q3 - q1
+    return {
+        "median": float(median),
+        "q1": float(q1),
+        "lower_bound": float(q1 - 1.5 * iqr),
+        "upper_bound": float(q3 + 1.5 * iqr),
+        "cap_value": float(cap_value),
+    }
+
+
+def clear_output(output_path, output_format):
+    if output_format == "csv":
+        if os.path.exists(output_path):
+            os.remove(output_path)
+    else:
+        for path in glob.glob(os.path.join(output_path, f"part-*.{output_format}")):
+            os.remove(path)
+
+
+def run_chunked(
+    input_path, output_path, output_format="csv", chunk_size=200000, k=2048
+):
+    if os.path.isdir(input_path):
+        raise ValueError("--chunked reads a raw CSV file, not a dataset directory")
+    timings = []
+
+    started = time.perf_counter()
+    sketch, missing, dtypes, _ = scan_response_times(input_path, chunk_size, k)
+    numeric = dtypes.get("Response Time (ms)") != "object"
+    parameters = sketch_parameters(sketch, missing, numeric)
+    timings.append(("pass 1: sketch response times", time.perf_counter() - started))
+
+    clear_output(output_path, output_format)
+    rows = 0
+    reader = pd.read_csv(
+        input_path,
+        on_bad_lines="skip",
+        chunksize=chunk_size,
+        dtype=pinned_dtypes(dtypes),
+    )
+    for part, chunk in enumerate(reader):
+        chunk = clean_logs(chunk, timings, dict(parameters))
+        started = time.perf_counter()
+        append_cleaned_logs(chunk, output_path, output_format, part)
+        timings.append(("append cleaned logs", time.perf_counter() - started))
+        rows += len(chunk)
+
+    return rows, sum_timings(timings), parameters, sketch.rank_error()
+
+
+def sum_timings(timings):
+    totals = {}
+    for name, seconds in timings:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return list(totals.items())
+
+
+def print_timings(timings, rows):
+    width = max(len(name) for name, _ in timings)
+    for name, seconds in timings:
+        print(f"  {name:<{width}}  {seconds:8.3f}s")
+    total = sum(seconds for _, seconds in timings)
+    print(
+        f"  {'total':<{width}}  {total:8.3f}s  ({rows / max(total, 1e-9):,.0f} rows/s)"
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Clean raw server logs for the dashboard"
+    )
+    parser.add_argument(
+        "--input",
+        default="data/raw_logs/final_server_logs12.csv",
+        help="raw CSV file or parquet/arrow dataset directory",
+    )
+    parser.add_argument("--output", default="data/cleaned_logs/cleaned12.csv")
+    parser.add_argument(
+        "--format", choices=["csv", "parquet", "feather"], default="csv"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only clean raw CSV rows added since the last run and append them; "
+        "--input may then be a directory of raw CSV files",
+    )
+    parser.add_argument(
+        "--manifest", help="checkpoint manifest (default: <output>.manifest.json)"
+    )
+    parser.add_argument(
+        "--chunked",
+        action="store_true",
+        help="stream the raw CSV in bounded chunks, fitting the outlier cap "
+        "with a quantile sketch, so memory stays flat for any input size",
+    )
+    parser.add_argument("--chunk-size", type=int, default=200000)
+    parser.add_argument(
+        "--sketch-size",
+        type=int,
+        default=2048,
+        help="items per sketch level; larger is more accurate",
+    )
+    parser.add_argument(
+        "--refresh-parameters",
+        action="store_true",
+        help="fit a new version of the response time parameters on this increment",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.chunked:
+        rows, timings, parameters, rank_error = run_chunked(
+            args.input, args.output, args.format, args.chunk_size, args.sketch_size
+        )
+        print(f"Cleaned {rows:,} rows from {args.input} into {args.output} in chunks")
+        print(
+            f"  response time cap {parameters['cap_value']:.2f}, "
+            f"IQR fences [{parameters['lower_bound']:.2f}, "
+            f"{parameters['upper_bound']:.2f}], "
+            f"quantile rank error <= {rank_error:.3%}"
+        )
+        print_timings(timings, rows)
+        return 0
+    if args.incremental:
+        rows, timings = run_incremental(
+            args.input, args.output, args.format, args.manifest, args.refresh_parameters
+        )
+        if rows == 0:
+            print(f"{args.output} is up to date with {args.input}")
+            return 0
+        print(f"Appended {rows:,} new rows from {args.input} to {args.output}")
+        print_timings(timings, rows)
+        return 0
+
+    df, timings = run_pipeline(args.input, args.output, args.format)
+    print(f"Cleaned {len(df):,} rows from {args.input} into {args.output}")
+    print_timings(timings, len(df))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import numpy as np
+
+
+class QuantileSketch:
+    """
+    Mergeable streaming quantile sketch (a compactor hierarchy in the style
+    of MRL/KLL) used to fit the response time parameters without holding the
+    column in memory.
+
+    Level h holds items that each stand for 2**h input values. When a level
+    reaches k items it is sorted and every other item, starting at a random
+    offset, is promoted to level h + 1. One compaction at level h moves any
+    rank by at most 2**h, and level h compacts at most n / (k * 2**h) times,
+    so every level adds at most n / k of rank error. With L levels a
+    returned quantile is therefore within
+
+        rank_error() = L / k
+
+    of the requested one, as a fraction of n, whatever the input order. For
+    k=2048 and 100M values (16 levels) that is under 0.8%; the random
+    offsets make the typical error much smaller. Memory is O(k * L).
+    """
+
+    def __init__(self, k=2048, seed=0):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self.rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        self.levels[0] = np.concatenate((self.levels[0], values))
+        self.compact()
+
+    def add(self, value, weight):
+        """
+        Adds value weight times, exactly, by splitting the weight into
+        powers of two
+        """
+        weight = int(weight)
+        self.count += weight
+        h = 0
+        while weight:
+            if weight & 1:
+                self.ensure_level(h)
+                self.levels[h] = np.append(self.levels[h], value)
+            weight >>= 1
+            h += 1
+        self.compact()
+
+    def merge(self, other):
+        for h, items in enumerate(other.levels):
+            self.ensure_level(h)
+            self.levels[h] = np.concatenate((self.levels[h], items))
+        self.count += other.count
+        self.compact()
+
+    def ensure_level(self, h):
+        while len(self.levels) <= h:
+            self.levels.append(np.empty(0))
+
+    def compact(self):
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if len(items) >= self.k:
+                items = np.sort(items)
+                # An odd item out stays at this level so no weight is lost
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                pairs = items[: len(items) - len(keep)]
+                offset = int(self.rng.integers(0, 2))
+                self.ensure_level(h + 1)
+                self.levels[h + 1] = np.concatenate(
+                    (self.levels[h + 1], pairs[offset::2])
+                )
+                self.levels[h] = keep
+            h += 1
+
+    def rank_error(self):
+        levels = max(len(self.levels), 1)
+        return min(levels / self.k, 1.0)
+
+    def quantiles(self, qs):
+        items = np.concatenate(self.levels)
+        if len(items) == 0:
+            return np.full(len(qs), np.nan)
+        weights = np.concatenate(
+            [np.full(len(level), 2.0**h) for h, level in enumerate(self.levels)]
+        )
+        order = np.argsort(items, kind="stable")
+        items = items[order]
+        cumulative = np.cumsum(weights[order])
+        targets = np.asarray(qs, dtype=np.float64) * cumulative[-1]
+        idx = np.searchsorted(cumulative, targets, side="left")
+        return items[np.minimum(idx, len(items) - 1)]
+
+    def quantile(self, q):
+        return float(self.quantiles([q])[0])
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        size = sum(len(level) for level in self.levels)
+        return (
+            f"QuantileSketch(k={self.k}, count={self.count:,}, items={size:,}, "
+            f"rank_error<={self.rank_error():.4%})"
+        )
@@ -0,0 +1,645 @@
+"""
+Query backends that answer the dashboard's aggregate metrics for a filter
+selection. PandasBackend scans the rows with the original groupbys and is
+the reference; SQLiteBackend and DuckDBBackend run the same metrics as SQL
+over a local copy of the dataset, so filters are pushed into the scan and
+DuckDB aggregates on every core. PolarsBackend runs them, and the traffic
+chart aggregates, as lazy multi-threaded Polars queries.
+
+Backends are built from the loaded DataFrame and only answer aggregates;
+the dashboard still keeps the rows in memory for its indexes and charts.
+SQLite is the slowest of them, several times slower than pandas.
+CubeBackend answers them the way the default dashboard does, from the
+FilterIndex and SalesCube through the metric registry, so the same checks
+cover the cube.
+
+    python -m data_preparation.query_backends --input data/cleaned_logs/cleaned12.csv \
+        --backend duckdb --checks 50
+    python -m data_preparation.query_backends --input data/cleaned_logs/cleaned12.csv \
+        --backend cube --checks 50
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_preparation.filter_index import FilterIndex, filter_dimensions
+from data_preparation.metrics import (
+    Metrics,
+    day_table,
+    funnel_stages,
+    funnel_table,
+    hour_table,
+)
+from data_preparation.olap_cube import SalesCube
+from data_preparation.upload_cache import evict
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+backend_cache_dir = "data/cache/sql"
+# Every dataset digest gets its own copy; a served directory makes a new
+# digest on each reload, so the oldest copies go once the total passes this
+backend_cache_bytes = 2 * 1024**3
+backend_extensions = (".sqlite", ".parquet")
+# Bumped whenever the copies change columns, so older ones are rebuilt
+copy_format = 2
+
+sql_columns = [
+    "Timestamp",
+    "Country",
+    "Product",
+    "Sales Agent",
+    "Referrer",
+    "Request Type",
+    "month",
+    "year",
+    "day_of_week",
+    "Revenue",
+    "IP Address",
+    "Session ID",
+]
+
+frame_metrics = ["visitors_by_day", "visitors_by_hour"]
+
+query_metrics = [
+    "product_sales",
+    "sales_by_country",
+    "product_sales_by_agent",
+    "conversion_by_referrer",
+    "monthly_sessions",
+    "total_sales",
+    "total_sales_revenue",
+    "total_visitors",
+    "conversion_by_IP",
+    "product_funnel",
+    "sales_volume_by_country",
+]
+
+
+def plain(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class PandasBackend:
+    """
+    Reference implementation: filters the rows with boolean masks and runs
+    the groupbys the dashboard originally used
+    """
+
+    name = "pandas"
+    metrics = query_metrics + frame_metrics
+
+    def __init__(self, df):
+        self.df = df
+
+    def filtered(self, start=None, end=None, selection=None):
+        df = self.df
+        mask = np.ones(len(df), dtype=bool)
+        if start is not None:
+            mask &= (df["Timestamp"] >= start).to_numpy()
+        if end is not None:
+            mask &= (df["Timestamp"] < end).to_numpy()
+        for column, value in (selection or {}).items():
+            if value is not None:
+                mask &= (df[column] == value).to_numpy()
+        return df[mask]
+
+    def compute(self, name, start=None, end=None, selection=None, approximate=False):
+        f = self.filtered(start, end, selection)
+        if name == "product_sales":
+            return (
+                f.groupby("Product", as_index=False, observed=True)["Revenue"]
+                .sum()
+                .sort_values(by="Revenue", ascending=False)
+            )
+        if name == "sales_by_country":
+            return (
+                f.groupby("Country", observed=True)["Revenue"]
+                .sum()
+                .reset_index()
+                .sort_values(by="Revenue", ascending=False)
+            )
+        if name == "product_sales_by_agent":
+            return (
+                f.groupby("Sales Agent", observed=True)["Revenue"].sum().reset_index()
+            )
+        if name == "conversion_by_referrer":
+            return f.groupby("Referrer", observed=True).agg(
+                {"Session ID": "nunique", "Product": lambda x: x.notnull().sum()}
+            )
+        if name == "monthly_sessions":
+            return f.groupby("month")["Session ID"].nunique()
+        if name == "total_sales":
+            return int((f["Request Type"] == "Product Purchase").sum())
+        if name == "total_sales_revenue":
+            return f["Revenue"].sum()
+        if name == "total_visitors":
+            return f["IP Address"].nunique()
+        if name == "conversion_by_IP":
+            return f[f["Product"].notna()]["IP Address"].nunique()
+        if name == "product_funnel":
+            sold = f[f["Product"].notna()]
+            return funnel_table(sold["Product"], sold["Request Type"])
+        if name == "sales_volume_by_country":
+            purchases = f[
+                f["Product"].notna() & (f["Request Type"] == "Product Purchase")
+            ]
+            return (
+                purchases.groupby("Country", observed=True)
+                .size()
+                .reset_index(name="Sales Made")
+            )
+        if name == "visitors_by_day":
+            return day_table(f.groupby("day_of_week")["IP Address"].nunique())
+        if name == "visitors_by_hour":
+            return hour_table(f.groupby("hour")["IP Address"].nunique())
+        raise KeyError(name)
+
+
+def stored_copy(path, write, max_bytes=backend_cache_bytes):
+    """
+    Makes sure the dataset copy at path exists, writing it with
+    write(tmp_path) when it does not, and marks it as recently used. The
+    least recently used copies beside it are then removed until the cache
+    directory fits in max_bytes.
+    """
+    cache_dir = os.path.dirname(path)
+    if os.path.exists(path):
+        os.utime(path)
+    else:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    evict(cache_dir, max_bytes, keep=path, extensions=backend_extensions)
+
+
+class SQLBackend:
+    """
+    Builds each metric as one SQL statement over a table named logs.
+    Subclasses provide the connection and how parameters are passed.
+    """
+
+    metrics = query_metrics + ["visitors_by_day"]
+    approximate_distinct = None
+
+    def where(self, start, end, selection, *extra):
+        clauses, params = [], []
+        if start is not None:
+            clauses.append('"Timestamp" >= ?')
+            params.append(self.timestamp(start))
+        if end is not None:
+            clauses.append('"Timestamp" < ?')
+            params.append(self.timestamp(end))
+        for column, value in (selection or {}).items():
+            if value is not None:
+                clauses.append(f'"{column}" = ?')
+                params.append(plain(value))
+        clauses.extend(extra)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def timestamp(self, value):
+        return pd.Timestamp(value).to_pydatetime()
+
+    def distinct(self, column, approximate):
+        if approximate and self.approximate_distinct:
+            return f'{self.approximate_distinct}("{column}")'
+        return f'COUNT(DISTINCT "{column}")'
+
+    def revenue_by(self, column, where, order):
+        return (
+            f'SELECT "{column}", SUM("Revenue") AS "Revenue" FROM logs{where} '
+            f'GROUP BY "{column}" ORDER BY {order}'
+        )
+
+    def compute(self, name, start=None, end=None, selection=None, approximate=False):
+        where, params = self.where(start, end, selection)
+        if name in ("product_sales", "sales_by_country", "product_sales_by_agent"):
+            column = {
+                "product_sales": "Product",
+                "sales_by_country": "Country",
+                "product_sales_by_agent": "Sales Agent",
+            }[name]
+            where, params = self.where(start, end, selection, f'"{column}" IS NOT NULL')
+            order = (
+                f'"{column}"' if name == "product_sales_by_agent" else '"Revenue" DESC'
+            )
+            return self.query(self.revenue_by(column, where, order), params)
+        if name == "conversion_by_referrer":
+            where, params = self.where(start, end, selection, '"Referrer" IS NOT NULL')
+            sessions = self.distinct("Session ID", approximate)
+            sql = (
+                f'SELECT "Referrer", {sessions} AS "Session ID", '
+                f'COUNT("Product") AS "Product" FROM logs{where} '
+                'GROUP BY "Referrer" ORDER BY "Referrer"'
+            )
+            return self.query(sql, params).set_index("Referrer")
+        if name == "monthly_sessions":
+            sessions = self.distinct("Session ID", approximate)
+            sql = (
+                f'SELECT "month", {sessions} AS "Session ID" '
+                f'FROM logs{where} GROUP BY "month" ORDER BY "month"'
+            )
+            return self.query(sql, params).set_index("month")["Session ID"]
+        if name == "total_sales":
+            where, params = self.where(
+                start, end, selection, "\"Request Type\" = 'Product Purchase'"
+            )
+            return int(self.scalar(f"SELECT COUNT(*) FROM logs{where}", params))
+        if name == "total_sales_revenue":
+            return self.scalar(
+                f'SELECT COALESCE(SUM("Revenue"), 0) FROM logs{where}', params
+            )
+        if name == "total_visitors":
+            sql = f'SELECT {self.distinct("IP Address", approximate)} FROM logs{where}'
+            return int(self.scalar(sql, params))
+        if name == "conversion_by_IP":
+            where, params = self.where(start, end, selection, '"Product" IS NOT NULL')
+            sql = f'SELECT {self.distinct("IP Address", approximate)} FROM logs{where}'
+            return int(self.scalar(sql, params))
+        if name == "visitors_by_day":
+            visitors = self.distinct("IP Address", approximate)
+            sql = (
+                f'SELECT "day_of_week", {visitors} AS "Visitors" '
+                f'FROM logs{where} GROUP BY "day_of_week" ORDER BY "day_of_week"'
+            )
+            return day_table(
+                self.query(sql, params).set_index("day_of_week")["Visitors"]
+            )
+        if name == "product_funnel":
+            where, params = self.where(start, end, selection, '"Product" IS NOT NULL')
+            stages = ", ".join(
+                f'COUNT(CASE WHEN "Request Type" = \'{stage}\' THEN 1 END) AS "{stage}"'
+                for stage in funnel_stages
+            )
+            sql = (
+                f'SELECT "Product", {stages} FROM logs{where} '
+                'GROUP BY "Product" ORDER BY "Product"'
+            )
+            return self.query(sql, params)
+        if name == "sales_volume_by_country":
+            where, params = self.where(
+                start,
+                end,
+                selection,
+                '"Product" IS NOT NULL',
+                '"Country" IS NOT NULL',
+                "\"Request Type\" = 'Product Purchase'",
+            )
+            sql = (
+                f'SELECT "Country", COUNT(*) AS "Sales Made" FROM logs{where} '
+                'GROUP BY "Country" ORDER BY "Country"'
+            )
+            return self.query(sql, params)
+        raise KeyError(name)
+
+    def scalar(self, sql, params):
+        return self.query(sql, params).iloc[0, 0]
+
+
+class SQLiteBackend(SQLBackend):
+    """
+    Copies the dataset into an SQLite file once per digest, indexed on
+    Timestamp, and opens a read-only connection per query so sessions can
+    query from their own threads
+    """
+
+    name = "sqlite"
+
+    def __init__(self, df, digest, cache_dir=backend_cache_dir):
+        self.path = os.path.join(cache_dir, f"{digest}-v{copy_format}.sqlite")
+
+        def write(tmp_path):
+            table = df[[c for c in sql_columns if c in df.columns]]
+            table = table.astype({c: object for c in table.select_dtypes("category")})
+            table["Timestamp"] = table["Timestamp"].dt.strftime("%Y-%m-%d %H:%M:%S")
+            with sqlite3.connect(tmp_path) as connection:
+                table.to_sql("logs", connection, index=False, chunksize=100000)
+                connection.execute('CREATE INDEX logs_timestamp ON logs ("Timestamp")')
+            connection.close()
+
+        stored_copy(self.path, write)
+
+    def timestamp(self, value):
+        return pd.Timestamp(value).strftime("%Y-%m-%d %H:%M:%S")
+
+    def query(self, sql, params):
+        connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            return pd.read_sql_query(sql, connection, params=params)
+        finally:
+            connection.close()
+
+
+class DuckDBBackend(SQLBackend):
+    """
+    Queries a Parquet copy of the dataset in place with DuckDB, which pushes
+    the filters into the Parquet scan and aggregates in parallel
+    """
+
+    name = "duckdb"
+    approximate_distinct = "approx_count_distinct"
+
+    def __init__(self, df, digest, cache_dir=backend_cache_dir):
+        if duckdb is None:
+            raise ImportError(
+                "The duckdb backend needs the duckdb package: pip install duckdb"
+            )
+        self.path = os.path.join(cache_dir, f"{digest}-v{copy_format}.parquet")
+        stored_copy(
+            self.path,
+            lambda tmp_path: df[[c for c in sql_columns if c in df.columns]].to_parquet(
+                tmp_path, index=False
+            ),
+        )
+        self.connection = duckdb.connect()
+        path = self.path.replace("'", "''")
+        self.connection.execute(
+            f"CREATE VIEW logs AS SELECT * FROM read_parquet('{path}')"
+        )
+
+    def query(self, sql, params):
+        # A cursor per query; the shared connection is not safe across threads
+        return self.connection.cursor().execute(sql, params).df()
+
+
+class PolarsBackend:
+    """
+    Holds the dataset as a Polars frame and answers each metric with a lazy
+    query, so the filters and the aggregation are planned together and run
+    on Polars' thread pool. Results are converted to the pandas tables the
+    Plotly code expects.
+    """
+
+    name = "polars"
+    metrics = query_metrics + frame_metrics
+
+    def __init__(self, df):
+        if pl is None:
+            raise ImportError(
+                "The polars backend needs the polars package: pip install polars"
+            )
+        columns = [c for c in sql_columns + ["hour"] if c in df.columns]
+        table = df[columns]
+        # Plain strings keep sort order and comparisons the same as pandas
+        table = table.astype({c: object for c in table.select_dtypes("category")})
+        self.frame = pl.from_pandas(table).lazy()
+
+    def filtered(self, start=None, end=None, selection=None, *extra):
+        predicates = list(extra)
+        if start is not None:
+            predicates.append(
+                pl.col("Timestamp") >= pd.Timestamp(start).to_pydatetime()
+            )
+        if end is not None:
+            predicates.append(pl.col("Timestamp") < pd.Timestamp(end).to_pydatetime())
+        for column, value in (selection or {}).items():
+            if value is not None:
+                predicates.append(pl.col(column) == plain(value))
+        return self.frame.filter(*predicates) if predicates else self.frame
+
+    def distinct(self, column):
+        return pl.col(column).drop_nulls().n_unique()
+
+    def revenue_by(self, column, f):
+        return (
+            f.filter(pl.col(column).is_not_null())
+            .group_by(column)
+            .agg(pl.col("Revenue").sum())
+        )
+
+    def series(self, f, by, column, alias):
+        table = (
+            f.filter(pl.col(by).is_not_null())
+            .group_by(by)
+            .agg(self.distinct(column).alias(alias))
+            .sort(by)
+            .collect()
+            .to_pandas()
+        )
+        return table.set_index(by)[alias]
+
+    def compute(self, name, start=None, end=None, selection=None, approximate=False):
+        f = self.filtered(start, end, selection)
+        if name in ("product_sales", "sales_by_country"):
+            column = "Product" if name == "product_sales" else "Country"
+            query = self.revenue_by(column, f).sort("Revenue", descending=True)
+            return query.collect().to_pandas()
+        if name == "product_sales_by_agent":
+            return (
+                self.revenue_by("Sales Agent", f)
+                .sort("Sales Agent")
+                .collect()
+                .to_pandas()
+            )
+        if name == "conversion_by_referrer":
+            query = (
+                f.filter(pl.col("Referrer").is_not_null())
+                .group_by("Referrer")
+                .agg(
+                    self.distinct("Session ID").alias("Session ID"),
+                    pl.col("Product").count(),
+                )
+                .sort("Referrer")
+            )
+            return query.collect().to_pandas().set_index("Referrer")
+        if name == "monthly_sessions":
+            return self.series(f, "month", "Session ID", "Session ID")
+        if name == "total_sales":
+            query = f.filter(pl.col("Request Type") == "Product Purchase").select(
+                pl.len()
+            )
+            return int(query.collect().item())
+        if name == "total_sales_revenue":
+            return f.select(pl.col("Revenue").sum()).collect().item()
+        if name == "total_visitors":
+            return int(f.select(self.distinct("IP Address")).collect().item())
+        if name == "conversion_by_IP":
+            query = f.filter(pl.col("Product").is_not_null()).select(
+                self.distinct("IP Address")
+            )
+            return int(query.collect().item())
+        if name == "product_funnel":
+            query = (
+                f.filter(pl.col("Product").is_not_null())
+                .group_by("Product")
+                .agg(
+                    [
+                        (pl.col("Request Type") == stage).sum().alias(stage)
+                        for stage in funnel_stages
+                    ]
+                )
+                .sort("Product")
+            )
+            return query.collect().to_pandas()
+        if name == "sales_volume_by_country":
+            query = (
+                f.filter(
+                    pl.col("Product").is_not_null(),
+                    pl.col("Country").is_not_null(),
+                    pl.col("Request Type") == "Product Purchase",
+                )
+                .group_by("Country")
+                .agg(pl.len().alias("Sales Made"))
+                .sort("Country")
+            )
+            return query.collect().to_pandas()
+        if name == "visitors_by_day":
+            return day_table(self.series(f, "day_of_week", "IP Address", "Visitors"))
+        if name == "visitors_by_hour":
+            return hour_table(self.series(f, "hour", "IP Address", "visitors"))
+        raise KeyError(name)
+
+
+class CubeBackend:
+    """
+    The dashboard's default path: metrics come from the registry over the
+    SalesCube, and the row-level ones from the FilterIndex selection. Not a
+    query backend the dashboard can switch to, only a way to check the cube
+    and index against the reference.
+    """
+
+    name = "cube"
+    metrics = PandasBackend.metrics
+
+    def __init__(self, df):
+        self.df = df
+        # Sales Agent too, since the checks also select by agent
+        self.index = FilterIndex(df, filter_dimensions + ["Sales Agent"])
+        self.cube = SalesCube(df)
+
+    def compute(self, name, start=None, end=None, selection=None, approximate=False):
+        m = Metrics(
+            self.index, self.cube, start, end, selection, approximate, frame=self.df
+        )
+        return m[name]
+
+
+backends = {
+    "pandas": PandasBackend,
+    "sqlite": SQLiteBackend,
+    "duckdb": DuckDBBackend,
+    "polars": PolarsBackend,
+}
+
+
+def create_backend(name, df, digest):
+    if name not in backends:
+        raise ValueError(
+            f"Unknown query backend {name!r}, expected one of {', '.join(backends)}"
+        )
+    if name in ("pandas", "polars"):
+        return backends[name](df)
+    return backends[name](df, digest)
+
+
+def same_result(a, b):
+    if isinstance(b, pd.DataFrame):
+        a, b = a.reset_index(), b.reset_index()
+        if "index" in b:
+            a, b = a.drop(columns="index", errors="ignore"), b.drop(columns="index")
+        a = a.astype({c: object for c in a.select_dtypes("category")})
+        b = b.astype({c: object for c in b.select_dtypes("category")})
+        pd.testing.assert_frame_equal(a, b, check_dtype=False, check_like=True)
+    elif isinstance(b, pd.Series):
+        pd.testing.assert_series_equal(
+            a, b, check_dtype=False, check_index_type=False, check_names=False
+        )
+    else:
+        assert np.isclose(a, b), f"{a} != {b}"
+
+
+def random_selection(df, rng):
+    days = pd.date_range(
+        df["Timestamp"].min().normalize(), df["Timestamp"].max().normalize()
+    )
+    start, end = sorted(rng.sample(list(days), 2))
+    selection = {
+        "Country": rng.choice([None] + list(df["Country"].dropna().unique())),
+        "Product": rng.choice([None] + list(df["Product"].dropna().unique())),
+        "month": rng.choice([None] + sorted(df["month"].unique())),
+        "year": rng.choice([None] + sorted(df["year"].unique())),
+        "Sales Agent": rng.choice([None] + list(df["Sales Agent"].dropna().unique())),
+    }
+    return start, end + pd.Timedelta(days=1), selection
+
+
+def check_backend(backend, reference, df, checks=20, seed=0):
+    """
+    Compares every metric of backend with the reference for the full
+    dataset and for checks random filter selections; returns the time each
+    backend spent
+    """
+    rng = random.Random(seed)
+    selections = [(None, None, {})] + [random_selection(df, rng) for _ in range(checks)]
+    spent = {backend.name: 0.0, reference.name: 0.0}
+    for start, end, selection in selections:
+        for name in backend.metrics:
+            results = []
+            for b in (backend, reference):
+                started = time.perf_counter()
+                results.append(b.compute(name, start, end, selection))
+                spent[b.name] += time.perf_counter() - started
+            try:
+                same_result(*results)
+            except AssertionError as error:
+                raise AssertionError(
+                    f"{name} differs for {start}..{end} {selection}: {error}"
+                )
+    return spent
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check a query backend against the pandas reference"
+    )
+    parser.add_argument(
+        "--input", required=True, help="cleaned CSV, parquet or feather file"
+    )
+    parser.add_argument(
+        "--backend", choices=list(backends) + ["cube"], default="sqlite"
+    )
+    parser.add_argument(
+        "--checks", type=int, default=20, help="random filter selections"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from data_preparation.data_preprocessing import read_dataset_file
+    from data_preparation.upload_cache import content_hash
+
+    args = parse_args(argv)
+    df = read_dataset_file(args.input)
+    started = time.perf_counter()
+    if args.backend == "cube":
+        backend = CubeBackend(df)
+    else:
+        backend = create_backend(args.backend, df, content_hash(args.input))
+    print(
+        f"Prepared the {args.backend} backend in {time.perf_counter() - started:.1f}s"
+    )
+    spent = check_backend(backend, PandasBackend(df), df, args.checks, args.seed)
+    print(f"All {len(backend.metrics)} metrics match on {args.checks + 1} selections")
+    for name, seconds in spent.items():
+        print(f"  {name:<8} {seconds:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
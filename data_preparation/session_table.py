@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+
+class SessionTable:
+    """
+    One row per session, built once per dataset with grouped min/max/count
+    aggregations: start, end, duration in minutes, pages (events), its
+    Referrer and Country, and whether any of its events sold a product.
+    codes maps every event row to its session, so a filtered view is the
+    slice of sessions that have a selected row.
+    """
+
+    def __init__(self, df):
+        # -1 where Session ID is missing; those rows belong to no session
+        self.codes, ids = pd.factorize(df["Session ID"])
+        valid = self.codes >= 0
+        codes = self.codes[valid]
+        events = pd.DataFrame(
+            {
+                "Timestamp": df["Timestamp"].to_numpy()[valid],
+                "Referrer": df["Referrer"].array[valid],
+                "Country": df["Country"].array[valid],
+                "converted": df["Product"].notna().to_numpy()[valid],
+            }
+        )
+        sessions = events.groupby(codes).agg(
+            start=("Timestamp", "min"),
+            end=("Timestamp", "max"),
+            pages=("Timestamp", "size"),
+            Referrer=("Referrer", "first"),
+            Country=("Country", "first"),
+            converted=("converted", "max"),
+        )
+        sessions.insert(0, "Session ID", np.asarray(ids))
+        sessions.insert(
+            3, "duration", (sessions["end"] - sessions["start"]).dt.total_seconds() / 60
+        )
+        sessions["pages"] = sessions["pages"].astype(np.int32)
+        self.sessions = sessions.reset_index(drop=True)
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def select(self, rows):
+        """
+        The sessions with at least one event among the row positions rows
+        """
+        chosen = np.zeros(len(self.sessions), dtype=bool)
+        codes = self.codes[rows]
+        chosen[codes[codes >= 0]] = True
+        return self.sessions[chosen]
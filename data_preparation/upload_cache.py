@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+upload_cache_dir = "data/cache/uploads"
+upload_cache_bytes = 2 * 1024**3
+hash_block_size = 1 << 20
+# Bumped whenever load_cached_data changes what it stores, so older entries miss
+cache_format = 4
+
+attrs_key = b"dashboard.attrs"
+
+
+def content_hash(file):
+    """
+    Streams a path or file-like object through blake2b in 1 MiB blocks and
+    returns the hex digest. File objects are rewound afterwards.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "rb") as f:
+            for block in iter(lambda: f.read(hash_block_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    file.seek(0)
+    for block in iter(lambda: file.read(hash_block_size), b""):
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def cache_path(digest, cache_dir=upload_cache_dir):
+    return os.path.join(cache_dir, f"{digest}-v{cache_format}.arrow")
+
+
+def read_cached_frame(digest, cache_dir=upload_cache_dir):
+    """
+    Returns the cached DataFrame for digest, or None on a miss. The file is
+    memory-mapped, and its mtime is bumped so eviction sees it as recently
+    used.
+    """
+    path = cache_path(digest, cache_dir)
+    try:
+        table = feather.read_table(path, memory_map=True)
+    except (FileNotFoundError, pa.ArrowInvalid):
+        return None
+    os.utime(path)
+
+    df = table.to_pandas()
+    metadata = table.schema.metadata or {}
+    if attrs_key in metadata:
+        df.attrs.update(json.loads(metadata[attrs_key]))
+        if "memory_mb" in df.attrs:
+            df.attrs["memory_mb"] = tuple(df.attrs["memory_mb"])
+    return df
+
+
+def write_cached_frame(
+    digest, df, cache_dir=upload_cache_dir, max_bytes=upload_cache_bytes
+):
+    # Uncompressed so later loads can map the file instead of decoding it
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    if df.attrs:
+        metadata[attrs_key] = json.dumps(df.attrs)
+    table = table.replace_schema_metadata(metadata)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_path(digest, cache_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+    evict(cache_dir, max_bytes, keep=path)
+    return path
+
+
+def evict(
+    cache_dir=upload_cache_dir,
+    max_bytes=upload_cache_bytes,
+    keep=None,
+    extensions=(".arrow",),
+):
+    """
+    Removes the least recently used entries, the files in cache_dir ending
+    in one of extensions, until the cache fits in max_bytes. keep is never
+    removed, even when it alone is over budget.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(extensions):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    removed = []
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed.append(path)
+    return removed
@@ -0,0 +1,110 @@
+import re
+from functools import lru_cache
+
+import pandas as pd
+
+PRODUCT_SLUGS = r"(performance-analytics-tool|ai-assistant|email-automation-ai)"
+SALE_PATTERN = rf"^/product/{PRODUCT_SLUGS}/request\.php$"
+DEMO_PATTERN = rf"^/product/{PRODUCT_SLUGS}/schedule-demo\.php$"
+
+product_names = {
+    "ai-assistant": "AI Virtual Assistant",
+    "email-automation-ai": "Email Automation AI",
+    "performance-analytics-tool": "Performance Analytics Tool",
+}
+
+catalog_columns = ["Request Type", "product", "action"]
+
+
+def categorize_url(method, path):
+    """Categorizes URLs based on method and path patterns"""
+    path = str(path).lower()  # Ensure string and case-insensitive
+
+    # Product Pages
+    if "/product/" in path:
+        if "schedule-demo" in path:
+            return "Demo Request"
+        elif "request.php" in path:
+            return "Product Purchase"
+        elif "feedback.php" in path:
+            return "Product Feedback"
+        else:
+            return "Product View"
+
+    # Sales Actions
+    elif any(p in path for p in ["/buy-", "/checkout", "/request-quote"]):
+        return "Sales Conversion"
+
+    # Marketing
+    elif any(p in path for p in ["/promo-", "/special-offers", "/newsletter"]):
+        return "Marketing Content"
+
+    # Support
+    elif any(p in path for p in ["/customer-support", "/faq", "/bug-tickets"]):
+        return "Support"
+
+    # Company Info
+    elif any(p in path for p in ["/about-us", "/contact-sales"]):
+        return "Company Info"
+
+    # Static Assets
+    elif any(ext in path for ext in [".jpg", ".png", ".css", ".js", "/images/"]):
+        return "Static Asset"
+
+    # Homepage
+    elif path in ["/", "/index.html", "/home"]:
+        return "Homepage"
+
+    else:
+        return "Other"
+
+
+@lru_cache(maxsize=None)
+def url_action(url):
+    """
+    Returns "sale" for product purchase URLs, "demo" for demo requests and
+    None for everything else, as used by the log generator
+    """
+    url = str(url)
+    if re.match(SALE_PATTERN, url):
+        return "sale"
+    if re.match(DEMO_PATTERN, url):
+        return "demo"
+    return None
+
+
+def url_product(url):
+    match = re.match(r"^/product/([a-z-]+?)(?:/|\.html$)", str(url))
+    return product_names.get(match.group(1)) if match else None
+
+
+@lru_cache(maxsize=None)
+def url_entry(url):
+    return (categorize_url(None, url), url_product(url), url_action(url))
+
+
+def build_url_catalog(urls):
+    """
+    One row per distinct URL with its Request Type, product and action
+    """
+    uniques = pd.unique(pd.Series(urls, dtype=object))
+    return pd.DataFrame(
+        [url_entry(u) for u in uniques],
+        index=pd.Index(uniques, name="URL"),
+        columns=catalog_columns,
+    )
+
+
+def lookup_urls(urls, column="Request Type"):
+    """
+    Looks a catalog column up for every row. URLs are factorized first so
+    the catalog is only built for the distinct values, and rows are filled
+    with a single take on the codes.
+    """
+    codes, uniques = pd.factorize(pd.Series(urls, dtype=object), use_na_sentinel=False)
+    catalog = build_url_catalog(uniques)
+    return catalog[column].to_numpy(dtype=object)[codes]
+
+
+def categorize_urls(urls):
+    return lookup_urls(urls, "Request Type")
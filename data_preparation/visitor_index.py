@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+
+class VisitorIndex:
+    """
+    The time every IP Address was first seen in the dataset, built once at
+    load time. IPs are numbered in first-seen order and codes maps every
+    event row to its IP, so the visitors of any set of rows come out
+    already sorted by first visit, ready for searchsorted counts.
+    """
+
+    def __init__(self, df):
+        # -1 where IP Address is missing
+        codes, _ = pd.factorize(df["IP Address"])
+        valid = codes >= 0
+        first_seen = (
+            pd.Series(df["Timestamp"].to_numpy()[valid])
+            .groupby(codes[valid])
+            .min()
+            .to_numpy()
+        )
+        order = np.argsort(first_seen, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        self.codes = np.where(valid, rank[np.maximum(codes, 0)], -1)
+        self.first_seen = first_seen[order]
+
+    def __len__(self):
+        return len(self.first_seen)
+
+    def select(self, rows):
+        """
+        Sorted first-seen timestamps of the visitors with an event among the
+        row positions rows
+        """
+        chosen = np.zeros(len(self.first_seen), dtype=bool)
+        codes = self.codes[rows]
+        chosen[codes[codes >= 0]] = True
+        return self.first_seen[chosen]
+
+
+def first_seen_in(first_seen, start=None, end=None, month=None, year=None):
+    """
+    The entries of the sorted first_seen array with start <= time < end
+    that also fall in month and year; None means no limit
+    """
+    bounds = [0, len(first_seen)]
+    for i, time in enumerate([start, end]):
+        if time is not None:
+            bounds[i] = np.searchsorted(first_seen, np.datetime64(time, "ns"))
+    inside = first_seen[bounds[0] : bounds[1]]
+    if month is None and year is None:
+        return inside
+    dates = pd.DatetimeIndex(inside)
+    keep = np.ones(len(inside), dtype=bool)
+    if month is not None:
+        keep &= dates.month == month
+    if year is not None:
+        keep &= dates.year == year
+    return inside[keep]
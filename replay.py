@@ -0,0 +1,152 @@
+"""
+Replays a log dataset in Timestamp order as a live event stream, either
+appended to a log file or written to a local socket, so the dashboard and
+ingestion can be measured against a sustained event rate.
+
+    python replay.py --input data/raw_logs/final_server_logs12.csv \
+        --output data/live/events.csv --speed 3600
+    python replay.py --rows 100000 --socket 127.0.0.1:9000 --speed max
+"""
+
+import argparse
+import os
+import socket
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from data_preparation.pipeline import read_partitioned_logs
+from script import generate_log_frame
+
+
+def read_dataset(path):
+    if os.path.isdir(path):
+        return read_partitioned_logs(path)
+    df = pd.read_csv(path, on_bad_lines="skip")
+    df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+    return df
+
+
+def open_sink(output=None, address=None):
+    """
+    Returns a writable text stream and whether it needs a header line.
+    address is "host:port" for TCP or a filesystem path for a Unix socket.
+    """
+    if address is None:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        needs_header = not os.path.exists(output) or os.path.getsize(output) == 0
+        return open(output, "a", newline="", buffering=1), needs_header
+
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        sock = socket.create_connection((host, int(port)))
+    else:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(address)
+    return sock.makefile("w", newline=""), True
+
+
+def replay(df, sink, speed=None, batch_size=10000, report_interval=1.0):
+    """
+    Writes df to sink as CSV lines in Timestamp order. With a speed
+    multiplier, events are released when their offset from the first
+    Timestamp, divided by speed, has elapsed on the wall clock; with
+    speed None they are written as fast as possible.
+    """
+    if df.empty:
+        return 0
+    df = df.sort_values("Timestamp", kind="stable", ignore_index=True)
+    offsets = (df["Timestamp"] - df["Timestamp"].iloc[0]).dt.total_seconds().to_numpy()
+    n = len(df)
+
+    started = time.perf_counter()
+    last_report = started
+    i = 0
+    while i < n:
+        if speed is None:
+            j = min(i + batch_size, n)
+        else:
+            event_time = (time.perf_counter() - started) * speed
+            j = min(
+                int(np.searchsorted(offsets, event_time, side="right")), i + batch_size
+            )
+            if j == i:
+                time.sleep(min((offsets[i] - event_time) / speed, report_interval))
+                continue
+        sink.write(df.iloc[i:j].to_csv(header=False, index=False))
+        sink.flush()
+        i = j
+
+        now = time.perf_counter()
+        if now - last_report >= report_interval or i == n:
+            last_report = now
+            report_progress(i, n, now - started, offsets[i - 1], speed)
+    return i
+
+
+def report_progress(done, total, elapsed, event_offset, speed):
+    line = f"  {done:,}/{total:,} events, {done / max(elapsed, 1e-9):,.0f} events/s"
+    if speed is not None:
+        # How far the stream is behind the requested schedule
+        lag = max(elapsed - event_offset / speed, 0)
+        line += f", {lag:.2f}s behind schedule"
+    print(line, flush=True)
+
+
+def parse_speed(value):
+    if value in ("max", "0", "inf"):
+        return None
+    try:
+        speed = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected a number or 'max', got {value!r}")
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("Speed must be positive")
+    return speed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay server logs as a live event stream"
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="CSV file or parquet/arrow dataset directory")
+    source.add_argument("--rows", type=int, help="generate this many rows instead")
+    parser.add_argument("--seed", type=int, default=42, help="seed for --rows")
+    sink = parser.add_mutually_exclusive_group(required=True)
+    sink.add_argument("--output", help="append-only CSV event log")
+    sink.add_argument("--socket", help="host:port for TCP, or a Unix socket path")
+    parser.add_argument(
+        "--speed",
+        type=parse_speed,
+        default=None,
+        help="event time seconds per wall clock second, or 'max' (default)",
+    )
+    parser.add_argument("--batch-size", type=int, default=10000)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.input:
+        df = read_dataset(args.input)
+    else:
+        df = generate_log_frame(args.rows, seed=args.seed)
+
+    sink, needs_header = open_sink(args.output, args.socket)
+    with sink:
+        if needs_header:
+            sink.write(df.head(0).to_csv(index=False))
+        speed = "max" if args.speed is None else f"{args.speed:g}x"
+        print(f"Replaying {len(df):,} events at {speed} speed")
+        started = time.perf_counter()
+        sent = replay(df, sink, args.speed, args.batch_size)
+    elapsed = time.perf_counter() - started
+    rate = sent / max(elapsed, 1e-9)
+    print(f"Replayed {sent:,} events in {elapsed:.1f}s ({rate:,.0f} events/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,21 @@
 import pandas as pd
 import numpy as np
+import os
 import random
+import shutil
+import sys
+import threading
+import time
+import argparse
+from multiprocessing import Manager
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from faker import Faker
 import uuid
 from fake_useragent import UserAgent
-import re
+import pyarrow as pa
+import pyarrow.parquet as pq
+from data_preparation.url_catalog import url_action
 
-fake = Faker()
 ua = UserAgent()
 
 # random seed
@@ -86,57 +94,193 @@ STATUS CODE GUIDE
 invalid_status_codes = [999, 000]
 
 
-def generate_IP_addresses(ip_pool=None):
-    countries = [
-        "USA",
-        "Canada",
-        "UK",
-        "Germany",
-        "France",
-        "Australia",
-        "Italy",
-        "Spain",
-        "India",
-        "China",
-        "Brazil",
-        "Mexico",
-        "Japan",
-        "South Korea",
-        "Russia",
-        "Argentina",
-        "South Africa",
-        "Turkey",
-        "Egypt",
-        "Nigeria",
-    ]
-    country_weights = [
-        0.2,
-        0.15,
-        0.1,
-        0.1,
-        0.1,
-        0.04,
-        0.04,
-        0.04,
-        0.04,
-        0.04,
-        0.02,
-        0.02,
-        0.02,
-        0.02,
-        0.02,
-        0.01,
-        0.01,
-        0.01,
-        0.01,
-        0.01,
+countries = [
+    "USA",
+    "Canada",
+    "UK",
+    "Germany",
+    "France",
+    "Australia",
+    "Italy",
+    "Spain",
+    "India",
+    "China",
+    "Brazil",
+    "Mexico",
+    "Japan",
+    "South Korea",
+    "Russia",
+    "Argentina",
+    "South Africa",
+    "Turkey",
+    "Egypt",
+    "Nigeria",
+]
+country_weights = [
+    0.2,
+    0.15,
+    0.1,
+    0.1,
+    0.1,
+    0.04,
+    0.04,
+    0.04,
+    0.04,
+    0.04,
+    0.02,
+    0.02,
+    0.02,
+    0.02,
+    0.02,
+    0.01,
+    0.01,
+    0.01,
+    0.01,
+    0.01,
+]
+
+
+month_weights = {
+    1: 0.08,
+    2: 0.07,
+    3: 0.06,
+    4: 0.069,
+    5: 0.081,
+    6: 0.083,
+    7: 0.082,
+    8: 0.04,
+    9: 0.075,
+    10: 0.075,
+    11: 0.09,
+    12: 0.1,
+}
+peak_hours = [8, 9, 10, 11, 14, 15, 16, 17]
+off_hours = [0, 1, 2, 3, 4, 5, 6]
+
+
+def build_cdf(weights):
+    cdf = np.cumsum(np.asarray(weights, dtype=np.float64))
+    cdf /= cdf[-1]
+    cdf[-1] = 1.0
+    return cdf
+
+
+def sample_cdf(rng, cdf, n):
+    return np.searchsorted(cdf, rng.random(n), side="right")
+
+
+ip_pool_size = 326895
+ip_pool_cache_dir = "data/cache"
+
+# Private, loopback, link-local, documentation, multicast and reserved ranges
+reserved_networks = [
+    ("0.0.0.0", 8),
+    ("10.0.0.0", 8),
+    ("100.64.0.0", 10),
+    ("127.0.0.0", 8),
+    ("169.254.0.0", 16),
+    ("172.16.0.0", 12),
+    ("192.0.0.0", 24),
+    ("192.0.2.0", 24),
+    ("192.88.99.0", 24),
+    ("192.168.0.0", 16),
+    ("198.18.0.0", 15),
+    ("198.51.100.0", 24),
+    ("203.0.113.0", 24),
+    ("224.0.0.0", 4),
+    ("240.0.0.0", 4),
+]
+
+
+def ipv4_to_int(address):
+    a, b, c, d = (int(part) for part in address.split("."))
+    return (a << 24) | (b << 16) | (c << 8) | d
+
+
+def ipv4_to_str(ips):
+    ips = np.asarray(ips, dtype=np.uint32)
+    octets = [
+        pd.Series((ips >> np.uint32(s)) & np.uint32(255)).astype(str)
+        for s in (24, 16, 8, 0)
     ]
+    return (octets[0] + "." + octets[1] + "." + octets[2] + "." + octets[3]).to_numpy(
+        dtype=object
+    )
+
+
+def is_public_ipv4(ips):
+    ips = np.asarray(ips, dtype=np.uint32)
+    public = np.ones(len(ips), dtype=bool)
+    for network, prefix in reserved_networks:
+        shift = np.uint32(32 - prefix)
+        public &= (ips >> shift) != np.uint32(ipv4_to_int(network) >> (32 - prefix))
+    return public
+
+
+def generate_ip_pool(seed, size=ip_pool_size):
+    """
+    Draws size distinct public IPv4 addresses as uint32 and gives each one a
+    fixed country, returned as an index into countries. The country array
+    has 9000 extra entries for the "invalid_url_NNNN" addresses.
+    """
+    rng = np.random.default_rng(seed)
+    ips = np.empty(0, dtype=np.uint32)
+    while len(ips) < size:
+        draw = rng.integers(0, 2**32, int(size * 1.3), dtype=np.uint32)
+        ips = np.unique(np.concatenate((ips, draw[is_public_ipv4(draw)])))
+    ips = rng.permutation(ips)[:size]
+    country = sample_cdf(rng, build_cdf(country_weights), size + 9000).astype(np.uint8)
+    return ips, country
+
+
+def load_ip_pool(seed=42, size=ip_pool_size, cache_dir=ip_pool_cache_dir):
+    """
+    Returns the (ips, country) pool for seed, reusing the cached copy from an
+    earlier run when there is one
+    """
+    path = os.path.join(cache_dir, f"ip_pool_{seed}_{size}.npz")
+    if os.path.exists(path):
+        with np.load(path) as cached:
+            return cached["ips"], cached["country"]
+
+    ips, country = generate_ip_pool(seed, size)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(path, ips=ips, country=country)
+    return ips, country
+
+
+default_ip_pool = None
+ip_countries = {}
+
+
+def reset_ip_countries():
+    # Each run starts from its own pool's countries only, so the invalid
+    # addresses an earlier run drew do not change this run's random draws
+    global default_ip_pool
+    default_ip_pool = None
+    ip_countries.clear()
+
+
+def pool_addresses(ips, country):
+    # Formats a pool for the row by row generator and registers its countries
+    addresses = list(ipv4_to_str(ips))
+    ip_countries.update(zip(addresses, np.asarray(countries, dtype=object)[country]))
+    return addresses
+
+
+def generate_IP_addresses(ip_pool=None):
+    global default_ip_pool
     if ip_pool is None:
-        ip_pool = [fake.ipv4_public() for i in range(20000)]
-    country = np.random.choice(countries, p=country_weights)
+        if default_ip_pool is None:
+            default_ip_pool = pool_addresses(*load_ip_pool(size=20000))
+        ip_pool = default_ip_pool
     ip = random.choice(ip_pool)
     if random.random() < 0.005:
         ip = f"invalid_url_{random.randint(1000, 9999)}"
+    # An address keeps the country it was first seen with
+    if ip not in ip_countries:
+        ip_countries[ip] = np.random.choice(countries, p=country_weights)
+    country = ip_countries[ip]
 
     return ip, country
 
@@ -145,20 +289,6 @@ def generate_random_date():
     """
     Implementing peak and off hours traffic
     """
-    month_weights = {
-        1: 0.08,
-        2: 0.07,
-        3: 0.06,
-        4: 0.069,
-        5: 0.081,
-        6: 0.083,
-        7: 0.082,
-        8: 0.04,
-        9: 0.075,
-        10: 0.075,
-        11: 0.09,
-        12: 0.1,
-    }
     random_days = random.choices(
         population=range((end_date - start_date).days + 1),
         weights=[
@@ -169,8 +299,6 @@ def generate_random_date():
         k=1,
     )[0]
     random_date = start_date + timedelta(days=random_days)
-    peak_hours = [8, 9, 10, 11, 14, 15, 16, 17]
-    off_hours = [0, 1, 2, 3, 4, 5, 6]
     if random_date.weekday() < 5 and random.random() < 0.7:
         hour = random.choices(
             peak_hours + off_hours,
@@ -188,6 +316,11 @@ def generate_random_date():
     return random_date.replace(hour=hour, minute=minute, second=second)
 
 
+def random_uuid():
+    # Drawn from the seeded random module so seeded runs are reproducible
+    return str(uuid.UUID(int=random.getrandbits(128), version=4))
+
+
 def generate_response_time():
     rt = max(50, np.random.normal(300, 100))
     if random.random() < 0.05:
@@ -230,7 +363,7 @@ def generate_server_log():
         response_time = random.choice(
             [random.randint(10000, 50000), random.uniform(0.1, 5)]
         )
-    session_id = str(uuid.uuid4())
+    session_id = random_uuid()
 
     return [
         timestamp,
@@ -245,11 +378,11 @@ def generate_server_log():
 
 
 def generate_sales_data(url):
-    sale_pattern = r"^/product/(performance-analytics-tool|ai-assistant|email-automation-ai)/request\.php$"
-    demo_pattern = r"^/product/(performance-analytics-tool|ai-assistant|email-automation-ai)/schedule-demo\.php$"
-    if not re.match(sale_pattern, url) and not (re.match(demo_pattern, url)):
+    # The URL catalog matches each distinct URL once and caches the result
+    action = url_action(url)
+    if action is None:
         return (None, 0, None)
-    if re.match(sale_pattern, url):
+    if action == "sale":
         if random.random():
             product, price = random.choice(products)
             agent = np.random.choice(sales_agents, p=sales_agents_weights)
@@ -260,17 +393,639 @@ def generate_sales_data(url):
             )
         else:
             return (None, 0, None)
-    if re.match(demo_pattern, url):
+    if action == "demo":
         product, _ = random.choice(products)
         agent = np.random.choice(sales_agents, p=sales_agents_weights)
         return (product, 0, agent)
 
 
-def generate_web_logs(num, file_name="data/raw_logs/final_server_logs12.csv"):
+# ---------------------------------------------------------------------------
+# Batched generation engine
+#
+# Samples whole chunks of rows as NumPy arrays instead of one row at a time.
+# Every per-row draw of the loop above is replaced by a lookup into a
+# precomputed CDF table, so the distributions stay the same while the cost
+# per row drops to a handful of vectorised operations.
+# ---------------------------------------------------------------------------
+
+time_window_duration = 120
+session_timeout = 30
+
+log_columns = [
+    "Timestamp",
+    "IP Address",
+    "Session ID",
+    "Country",
+    "Method",
+    "URL",
+    "Status Code",
+    "Response Time (ms)",
+    "Sales Agent",
+    "Referrer",
+    "Product",
+    "Price",
+]
+
+
+def build_sampling_tables(date_range=None):
+    first_day, last_day = date_range or (start_date, end_date)
+    num_days = (last_day - first_day).days + 1
+    day_dates = [first_day + timedelta(days=i) for i in range(num_days)]
+    day_weights = [
+        (1.2 if d.weekday() < 5 else 0.5) * month_weights[d.month] for d in day_dates
+    ]
+    hours = peak_hours + off_hours
+    methods, urls, url_weights = zip(*page_requests)
+
+    # Sale/demo detection comes from the URL catalog once per distinct URL
+    action_kind = {None: 0, "sale": 1, "demo": 2}
+    url_kind = np.array([action_kind[url_action(url)] for url in urls], dtype=np.int8)
+
+    no_201 = [w if s != 201 else 0.0 for s, w in zip(status_codes, status_code_weights)]
+    return {
+        "day_cdf": build_cdf(day_weights),
+        "day_start": np.array(day_dates, dtype="datetime64[s]").astype(np.int64),
+        "day_is_weekday": np.array([d.weekday() < 5 for d in day_dates]),
+        "hours": np.array(hours, dtype=np.int64),
+        "peak_hour_cdf": build_cdf([10 if h in peak_hours else 1 for h in hours]),
+        "off_hour_cdf": build_cdf([3 if h in peak_hours else 5 for h in hours]),
+        "methods": np.array(methods, dtype=object),
+        "urls": np.array(urls, dtype=object),
+        "url_cdf": build_cdf(url_weights),
+        "url_is_post": np.array([m == "POST" for m in methods]),
+        "url_kind": url_kind,
+        "status_codes": np.array(status_codes, dtype=np.int64),
+        "post_status_cdf": build_cdf(status_code_weights),
+        "get_status_cdf": build_cdf(no_201),
+        "countries": np.array(countries, dtype=object),
+        "country_cdf": build_cdf(country_weights),
+        "referrers": np.array(referrer_sites, dtype=object),
+        "referrer_cdf": build_cdf(referrer_sites_weights),
+        "agents": np.array(sales_agents + [None], dtype=object),
+        "agent_cdf": build_cdf(sales_agents_weights),
+        "products": np.array([p for p, _ in products] + [None], dtype=object),
+        "product_prices": np.array([p for _, p in products], dtype=np.float64),
+    }
+
+
+def sample_random_dates(rng, tables, n):
+    """
+    Vectorised generate_random_date, returns seconds since the epoch
+    """
+    day = sample_cdf(rng, tables["day_cdf"], n)
+    peak = tables["day_is_weekday"][day] & (rng.random(n) < 0.7)
+    hour_idx = np.where(
+        peak,
+        sample_cdf(rng, tables["peak_hour_cdf"], n),
+        sample_cdf(rng, tables["off_hour_cdf"], n),
+    )
+    return (
+        tables["day_start"][day]
+        + tables["hours"][hour_idx] * 3600
+        + rng.integers(0, 60, n) * 60
+        + rng.integers(0, 60, n)
+    )
+
+
+def sample_response_times(rng, n):
+    """
+    Vectorised generate_response_time plus the extra 5% outliers applied on top
+    """
+    rt = np.round(np.maximum(50, rng.normal(300, 100, n)), 2)
+    odd = rng.random(n) < 0.05
+    slow = rng.random(n) < 0.3
+    rt = np.where(
+        odd,
+        np.where(
+            slow,
+            rng.integers(500, 20001, n),
+            np.round(rng.uniform(1, 50, n), 2),
+        ),
+        rt,
+    )
+    outlier = rng.random(n) < 0.05
+    huge = rng.random(n) < 0.5
+    return np.where(
+        outlier,
+        np.where(huge, rng.integers(10000, 50001, n), rng.uniform(0.1, 5, n)),
+        rt,
+    )
+
+
+def splitmix64(x):
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+# Hex digit spans of the five dash-separated UUID groups
+uuid_groups = [(0, 8), (8, 12), (12, 16), (16, 20), (20, 32)]
+
+
+def format_session_uuids(session_keys, salt):
+    """
+    Turns integer session keys into uuid4 formatted strings. The mapping is a
+    pure function of the key so sessions carried across chunks keep their id.
+    """
+    keys = np.asarray(session_keys, dtype=np.uint64)
+    raw = np.empty((len(keys), 2), dtype=">u8")
+    raw[:, 0] = (
+        splitmix64(keys ^ np.uint64(salt)) & np.uint64(0xFFFFFFFFFFFF0FFF)
+    ) | np.uint64(0x4000)
+    raw[:, 1] = (
+        splitmix64(keys ^ np.uint64(~salt & 0xFFFFFFFFFFFFFFFF))
+        & np.uint64(0x3FFFFFFFFFFFFFFF)
+    ) | np.uint64(0x8000000000000000)
+    h = raw.tobytes().hex()
+    return np.array(
+        [
+            "-".join(h[i + start : i + stop] for start, stop in uuid_groups)
+            for i in range(0, len(h), 32)
+        ],
+        dtype=object,
+    )
+
+
+def new_generator_state(rng, tables, ip_pool, shard=0, session_key="uuid"):
+    ips, ip_country = ip_pool
+    # One slot per pool address plus one per possible "invalid_url_NNNN" value
+    num_keys = len(ips) + 9000
+    return {
+        "ip_pool": ipv4_to_str(ips),
+        "ip_country": ip_country,
+        "window_start": sample_random_dates(rng, tables, 1)[0],
+        "last_ts": np.full(num_keys, -1, dtype=np.int64),
+        "last_session": np.full(num_keys, -1, dtype=np.int64),
+        "last_referrer": np.full(num_keys, -1, dtype=np.int64),
+        "next_session": 0,
+        "shard": shard,
+        "session_key": session_key,
+        # Keeps session ids of different shards apart
+        "salt": int(rng.integers(0, 2**64, dtype=np.uint64)),
+    }
+
+
+def assign_sessions(rng, tables, state, ip_key, ts):
+    """
+    Vectorised ip_session_map: a hit continues the previous session of its IP
+    unless the gap exceeds the session timeout or the day changed.
+    """
+    n = len(ip_key)
+    order = np.argsort(ip_key, kind="stable")
+    s_ip = ip_key[order]
+    s_ts = ts[order]
+
+    first = np.ones(n, dtype=bool)
+    first[1:] = s_ip[1:] != s_ip[:-1]
+    prev_ts = np.empty(n, dtype=np.int64)
+    prev_ts[1:] = s_ts[:-1]
+    prev_ts[first] = state["last_ts"][s_ip[first]]
+    seen = prev_ts >= 0
+
+    new = (
+        ~seen
+        | (s_ts - prev_ts > session_timeout * 60)
+        | (s_ts // 86400 != prev_ts // 86400)
+    )
+    num_new = int(new.sum())
+
+    session = np.full(n, -1, dtype=np.int64)
+    session[new] = state["next_session"] + np.arange(num_new)
+    state["next_session"] += num_new
+    carried = first & ~new
+    session[carried] = state["last_session"][s_ip[carried]]
+
+    # First-time IPs pick a referrer uniformly, returning ones by weight
+    referrer = np.full(n, -1, dtype=np.int64)
+    referrer[new] = np.where(
+        seen[new],
+        sample_cdf(rng, tables["referrer_cdf"], num_new),
+        rng.integers(0, len(tables["referrers"]), num_new),
+    )
+    referrer[carried] = state["last_referrer"][s_ip[carried]]
+
+    # Forward fill each IP group from its session start
+    fill = np.where(session >= 0, np.arange(n), 0)
+    np.maximum.accumulate(fill, out=fill)
+    session = session[fill]
+    referrer = referrer[fill]
+
+    last = np.ones(n, dtype=bool)
+    last[:-1] = s_ip[:-1] != s_ip[1:]
+    state["last_ts"][s_ip[last]] = s_ts[last]
+    state["last_session"][s_ip[last]] = session[last]
+    state["last_referrer"][s_ip[last]] = referrer[last]
+
+    out_session = np.empty(n, dtype=np.int64)
+    out_referrer = np.empty(n, dtype=np.int64)
+    out_session[order] = session
+    out_referrer[order] = referrer
+    return out_session, out_referrer
+
+
+def generate_log_batch(rng, tables, state, n):
+    """
+    Generates n page views as a DataFrame with the same columns and
+    distributions as the row by row loop in generate_web_logs
+    """
+    # Time windows: every hit has a 5% chance of jumping to a new window
+    jumps = rng.random(n) < 0.05
+    window_id = np.cumsum(jumps)
+    starts = np.concatenate(
+        ([state["window_start"]], sample_random_dates(rng, tables, int(jumps.sum())))
+    )
+    state["window_start"] = starts[-1]
+    ts = starts[window_id] + rng.integers(0, time_window_duration * 60 + 1, n)
+
+    pool = state["ip_pool"]
+    ip_key = rng.integers(0, len(pool), n)
+    invalid_ip = rng.random(n) < 0.005
+    ip_key[invalid_ip] = len(pool) + rng.integers(0, 9000, int(invalid_ip.sum()))
+    country = tables["countries"][state["ip_country"][ip_key]]
+    ip_address = pool[np.minimum(ip_key, len(pool) - 1)]
+    ip_address[invalid_ip] = [
+        f"invalid_url_{k - len(pool) + 1000}" for k in ip_key[invalid_ip]
+    ]
+
+    session, referrer = assign_sessions(rng, tables, state, ip_key, ts)
+    if state["session_key"] == "int":
+        # Compact int64 key, unique across shards: shard in the top bits
+        session_id = (np.int64(state["shard"]) << np.int64(40)) | session
+    else:
+        unique_sessions, session_idx = np.unique(session, return_inverse=True)
+        session_id = format_session_uuids(unique_sessions, state["salt"])[session_idx]
+
+    url_idx = sample_cdf(rng, tables["url_cdf"], n)
+    method = tables["methods"][url_idx]
+    url = tables["urls"][url_idx]
+    invalid_url = rng.random(n) < 0.02
+    url[invalid_url] = [
+        f"invalid_url_{k}" for k in rng.integers(1000, 10000, int(invalid_url.sum()))
+    ]
+    kind = np.where(invalid_url, 0, tables["url_kind"][url_idx])
+
+    # Sales data: sale and demo URLs get a random product and weighted agent
+    num_products = len(tables["product_prices"])
+    has_product = kind > 0
+    product_idx = np.where(has_product, rng.integers(0, num_products, n), num_products)
+    agent_idx = np.where(
+        has_product,
+        sample_cdf(rng, tables["agent_cdf"], n),
+        len(tables["agents"]) - 1,
+    )
+    price = np.where(
+        kind == 1,
+        np.round(
+            tables["product_prices"][np.minimum(product_idx, num_products - 1)]
+            * rng.uniform(0.9, 1.1, n),
+            2,
+        ),
+        0.0,
+    )
+
+    status = tables["status_codes"][
+        np.where(
+            tables["url_is_post"][url_idx],
+            sample_cdf(rng, tables["post_status_cdf"], n),
+            sample_cdf(rng, tables["get_status_cdf"], n),
+        )
+    ]
+    status[rng.random(n) < 0.03] = 999
+
+    return pd.DataFrame(
+        {
+            "Timestamp": ts.astype("datetime64[s]"),
+            "IP Address": ip_address,
+            "Session ID": session_id,
+            "Country": country,
+            "Method": method,
+            "URL": url,
+            "Status Code": status,
+            "Response Time (ms)": sample_response_times(rng, n),
+            "Sales Agent": tables["agents"][agent_idx],
+            "Referrer": tables["referrers"][referrer],
+            "Product": tables["products"][product_idx],
+            "Price": price,
+        },
+        columns=log_columns,
+    )
+
+
+def add_derived_columns(df):
+    # demo_metadata and purchase_info are never filled by the generator, so
+    # these columns always hold their defaults
+    if pd.api.types.is_integer_dtype(df["Session ID"]):
+        # Integer session keys never span two IPs, so they already identify
+        # the IP and session pair
+        df["IP_Session"] = df["Session ID"]
+    else:
+        df["IP_Session"] = df["IP Address"] + "_" + df["Session ID"]
+    df["viewed_pricing_after_demo"] = False
+    df["pages_after_demo"] = 0
+    df["sessions_after_demo"] = 0
+    df["time_to_purchase"] = np.nan
+    return df
+
+
+def shard_file_name(file_name, shard):
+    root, ext = os.path.splitext(file_name)
+    return f"{root}.part-{shard:05d}{ext}"
+
+
+# Columnar output: low-cardinality columns use fixed dictionaries so every
+# chunk, shard and partition file shares the same encoding
+dictionary_values = {
+    "Country": countries,
+    "Method": ["GET", "POST"],
+    "Sales Agent": sales_agents,
+    "Referrer": referrer_sites,
+    "Product": [p for p, _ in products],
+}
+
+arrow_schema = pa.schema(
+    [
+        ("Timestamp", pa.timestamp("s")),
+        ("IP Address", pa.string()),
+        ("Session ID", pa.string()),
+        ("Country", pa.dictionary(pa.int8(), pa.string())),
+        ("Method", pa.dictionary(pa.int8(), pa.string())),
+        ("URL", pa.string()),
+        ("Status Code", pa.int16()),
+        ("Response Time (ms)", pa.float64()),
+        ("Sales Agent", pa.dictionary(pa.int8(), pa.string())),
+        ("Referrer", pa.dictionary(pa.int8(), pa.string())),
+        ("Product", pa.dictionary(pa.int8(), pa.string())),
+        ("Price", pa.float64()),
+        ("IP_Session", pa.string()),
+        ("viewed_pricing_after_demo", pa.bool_()),
+        ("pages_after_demo", pa.int32()),
+        ("sessions_after_demo", pa.int32()),
+        ("time_to_purchase", pa.float64()),
+    ]
+)
+
+
+def to_arrow_table(chunk):
+    schema = arrow_schema
+    if pd.api.types.is_integer_dtype(chunk["Session ID"]):
+        for name in ("Session ID", "IP_Session"):
+            schema = schema.set(
+                schema.get_field_index(name), pa.field(name, pa.int64())
+            )
+
+    arrays = []
+    for field in schema:
+        if field.name in dictionary_values:
+            values = dictionary_values[field.name]
+            codes = pd.Categorical(chunk[field.name], categories=values).codes
+            arrays.append(
+                pa.DictionaryArray.from_arrays(
+                    pa.array(codes.astype(np.int8), mask=codes < 0),
+                    pa.array(values, pa.string()),
+                )
+            )
+        else:
+            arrays.append(
+                pa.array(chunk[field.name], type=field.type, from_pandas=True)
+            )
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def open_partition_writer(path, output_format, schema):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if output_format == "parquet":
+        return pq.ParquetWriter(path, schema)
+    return pa.ipc.new_file(path, schema)
+
+
+def write_partitioned(chunk, root, shard, writers, output_format):
+    """
+    Appends a chunk to a hive style year=YYYY/month=M dataset under root,
+    keeping one open writer per partition so each shard writes one file per
+    month
+    """
+    table = to_arrow_table(chunk)
+    ts = chunk["Timestamp"]
+    key = (ts.dt.year * 100 + ts.dt.month).to_numpy()
+    extension = "parquet" if output_format == "parquet" else "arrow"
+    for k in np.unique(key):
+        if k not in writers:
+            path = os.path.join(
+                root,
+                f"year={k // 100}",
+                f"month={k % 100}",
+                f"part-{shard:05d}.{extension}",
+            )
+            writers[k] = open_partition_writer(path, output_format, table.schema)
+        writers[k].write_table(table.take(np.flatnonzero(key == k)))
+
+
+def iter_log_chunks(rng, tables, state, num, chunk_size):
+    for offset in range(0, num, chunk_size):
+        chunk = generate_log_batch(rng, tables, state, min(chunk_size, num - offset))
+        yield add_derived_columns(chunk)
+
+
+def generate_shard(
+    shard_seed,
+    num,
+    file_name,
+    chunk_size,
+    ip_pool,
+    shard=0,
+    output_format="csv",
+    session_key="uuid",
+    date_range=None,
+    progress=None,
+):
+    """
+    Generates one shard with its own generator and session state and streams
+    it to file_name chunk_size rows at a time, so memory stays bounded by the
+    chunk size and the IP pool whatever num is. Only depends on its
+    arguments, so a shard produces the same bytes whichever process runs it.
+    progress, if given, gets put() the row count of every written chunk.
+    """
+    rng = np.random.default_rng(shard_seed)
+    tables = build_sampling_tables(date_range)
+    state = new_generator_state(rng, tables, ip_pool, shard, session_key)
+    chunks = iter_log_chunks(rng, tables, state, num, chunk_size)
+
+    if output_format == "csv":
+        with open(file_name, "w", newline="") as f:
+            for i, chunk in enumerate(chunks):
+                chunk.to_csv(f, index=False, header=i == 0)
+                if progress is not None:
+                    progress.put(len(chunk))
+        return num
+
+    writers = {}
+    try:
+        for chunk in chunks:
+            write_partitioned(chunk, file_name, shard, writers, output_format)
+            if progress is not None:
+                progress.put(len(chunk))
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return num
+
+
+def generate_log_frame(
+    num, seed=42, chunk_size=100000, session_key="uuid", date_range=None
+):
+    """
+    In-memory counterpart of a single shard run, returns the same rows as
+    generate_web_logs_batched(num, ..., seed=seed) as one DataFrame
+    """
+    pool_seed, shard_seed = np.random.SeedSequence(seed).spawn(2)
+    ip_pool = load_ip_pool(int(pool_seed.generate_state(1)[0]))
+    rng = np.random.default_rng(shard_seed)
+    tables = build_sampling_tables(date_range)
+    state = new_generator_state(rng, tables, ip_pool, 0, session_key)
+    return pd.concat(
+        iter_log_chunks(rng, tables, state, num, chunk_size), ignore_index=True
+    )
+
+
+def merge_shard_files(parts, file_name):
+    with open(file_name, "wb") as out:
+        for i, part in enumerate(parts):
+            with open(part, "rb") as f:
+                if i > 0:
+                    f.readline()  # header
+                shutil.copyfileobj(f, out)
+            os.remove(part)
+
+
+def generate_web_logs_batched(
+    num,
+    file_name,
+    chunk_size=100000,
+    seed=42,
+    shards=1,
+    workers=None,
+    merge=True,
+    output_format="csv",
+    session_key="uuid",
+    date_range=None,
+    progress=None,
+):
+    """
+    Runs the batched engine and returns the paths it wrote: the CSV file,
+    the shard files when they are not merged, or the dataset directory for
+    columnar formats
+    """
+    if output_format not in ("csv", "parquet", "arrow"):
+        raise ValueError(f"Unknown output format: {output_format}")
+    if session_key not in ("uuid", "int"):
+        raise ValueError(f"Unknown session key: {session_key}")
+
+    # Every shard seed, and the IP pool seed, is spawned from the master seed
+    pool_seed, *shard_seeds = np.random.SeedSequence(seed).spawn(shards + 1)
+    ip_pool = load_ip_pool(int(pool_seed.generate_state(1)[0]))
+
+    sizes = [num // shards + (1 if i < num % shards else 0) for i in range(shards)]
+    if output_format != "csv":
+        # Columnar output is a partitioned dataset directory named after the
+        # file, and shards write their files side by side inside it
+        file_name = os.path.splitext(file_name)[0]
+        parts = [file_name] * shards
+        merge = False
+    elif shards == 1:
+        parts = [file_name]
+    else:
+        parts = [shard_file_name(file_name, i) for i in range(shards)]
+    os.makedirs(os.path.dirname(file_name) or ".", exist_ok=True)
+
+    if workers is None:
+        workers = min(shards, os.cpu_count() or 1)
+    args = (
+        shard_seeds,
+        sizes,
+        parts,
+        [chunk_size] * shards,
+        [ip_pool] * shards,
+        range(shards),
+        [output_format] * shards,
+        [session_key] * shards,
+        [date_range] * shards,
+    )
+    if workers > 1:
+        with Manager() as manager, ProcessPoolExecutor(max_workers=workers) as executor:
+            # Workers report chunks through a managed queue that a thread
+            # here forwards to the caller's progress
+            queue = manager.Queue() if progress is not None else None
+            if queue is not None:
+                forwarder = threading.Thread(
+                    target=forward_progress, args=(queue, progress), daemon=True
+                )
+                forwarder.start()
+            list(executor.map(generate_shard, *args, [queue] * shards))
+            if queue is not None:
+                queue.put(None)
+                forwarder.join()
+    else:
+        list(map(generate_shard, *args, [progress] * shards))
+
+    if shards > 1 and merge:
+        merge_shard_files(parts, file_name)
+        print(f"{num} server logs from {shards} shards saved to {file_name}")
+        return [file_name]
+    elif shards > 1 and output_format == "csv":
+        print(f"{num} server logs saved to {shards} shard files next to {file_name}")
+        return parts
+    print(f"{num} server logs saved to {file_name}")
+    return [file_name]
+
+
+def forward_progress(queue, progress):
+    while (rows := queue.get()) is not None:
+        progress.put(rows)
+
+
+def generate_web_logs(
+    num,
+    file_name="data/raw_logs/final_server_logs12.csv",
+    batched=False,
+    chunk_size=100000,
+    seed=42,
+    shards=1,
+    workers=None,
+    merge=True,
+    output_format="csv",
+    session_key="uuid",
+    date_range=None,
+    progress=None,
+):
+    if (
+        batched
+        or shards > 1
+        or output_format != "csv"
+        or session_key != "uuid"
+        or date_range is not None
+    ):
+        return generate_web_logs_batched(
+            num,
+            file_name,
+            chunk_size,
+            seed,
+            shards,
+            workers,
+            merge,
+            output_format,
+            session_key,
+            date_range,
+            progress,
+        )
+
+    random.seed(seed)
+    np.random.seed(seed)
+    reset_ip_countries()
     logs = []
     ip_session_map = {}
     session_timeout = 30
-    ip_pool = [fake.ipv4_public() for _ in range(326895)]
+    ip_pool = pool_addresses(*load_ip_pool(seed))
 
     current_time_window = generate_random_date()
     time_window_duration = 120
@@ -312,12 +1067,12 @@ def generate_web_logs(num, file_name="data/raw_logs/final_server_logs12.csv"):
                     time_since_last > session_timeout
                     or timestamp.date() != last_timestamp.date()
                 ):
-                    session_id = str(uuid.uuid4())
+                    session_id = random_uuid()
                     session_referrers[session_id] = np.random.choice(
                         referrer_sites, p=referrer_sites_weights
                     )
             else:
-                session_id = str(uuid.uuid4())
+                session_id = random_uuid()
                 session_referrers[session_id] = random.choice(referrer_sites)
 
             ip_session_map[ip_address] = (timestamp, session_id)
@@ -659,6 +1414,131 @@ def generate_web_logs(num, file_name="data/raw_logs/final_server_logs12.csv"):
 #     print(f"Average pages per session: {num / len(sessions):.2f}")
 
 
+scale_presets = {
+    "100k": 100_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+    "100m": 100_000_000,
+}
+
+
+class ProgressReporter:
+    """
+    Prints rows generated so far at most once per interval seconds
+    """
+
+    def __init__(self, total, interval=1.0):
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.started = time.perf_counter()
+        self.last_report = self.started
+
+    def put(self, rows):
+        self.done += rows
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval or self.done >= self.total:
+            self.last_report = now
+            rate = self.done / max(now - self.started, 1e-9)
+            print(
+                f"  {self.done:,}/{self.total:,} rows "
+                f"({self.done / self.total:.0%}) at {rate:,.0f} rows/s",
+                flush=True,
+            )
+
+
+def output_size(paths):
+    total = 0
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+        elif os.path.exists(path):
+            total += os.path.getsize(path)
+    return total
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected a YYYY-MM-DD date, got {value!r}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic web server logs for the sales dashboard"
+    )
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--rows", type=int, help="number of log rows (default 750000)")
+    size.add_argument(
+        "--preset",
+        choices=scale_presets,
+        help="named scale preset: "
+        + ", ".join(f"{k}={v:,}" for k, v in scale_presets.items()),
+    )
+    parser.add_argument(
+        "--start", type=parse_date, default=start_date, help="first day, YYYY-MM-DD"
+    )
+    parser.add_argument(
+        "--end", type=parse_date, default=end_date, help="last day, YYYY-MM-DD"
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--format", choices=["csv", "parquet", "arrow"], default="csv")
+    parser.add_argument(
+        "--output",
+        default="data/raw_logs/final_server_logs12.csv",
+        help="CSV file, or dataset directory (extension dropped) for parquet/arrow",
+    )
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="processes (default: one per shard, at most one per CPU)",
+    )
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    parser.add_argument("--session-key", choices=["uuid", "int"], default="uuid")
+    parser.add_argument(
+        "--no-merge", action="store_true", help="keep CSV shard files side by side"
+    )
+    args = parser.parse_args(argv)
+
+    args.rows = scale_presets[args.preset] if args.preset else (args.rows or 750000)
+    if args.rows <= 0 or args.shards <= 0 or args.chunk_size <= 0:
+        parser.error("--rows, --shards and --chunk-size must be positive")
+    if args.end < args.start:
+        parser.error("--end must not be before --start")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(
+        f"Generating {args.rows:,} rows from {args.start:%Y-%m-%d} "
+        f"to {args.end:%Y-%m-%d} as {args.format} with seed {args.seed}..."
+    )
+    started = time.perf_counter()
+    paths = generate_web_logs_batched(
+        args.rows,
+        args.output,
+        chunk_size=args.chunk_size,
+        seed=args.seed,
+        shards=args.shards,
+        workers=args.workers,
+        merge=not args.no_merge,
+        output_format=args.format,
+        session_key=args.session_key,
+        date_range=(args.start, args.end),
+        progress=ProgressReporter(args.rows),
+    )
+    elapsed = time.perf_counter() - started
+    written = output_size(paths)
+    print(
+        f"Done in {elapsed:.1f}s: {args.rows / elapsed:,.0f} rows/s, "
+        f"{written:,} bytes written ({written / elapsed / 1e6:.1f} MB/s)"
+    )
+    return 0
+
+
 if __name__ == "__main__":
-    print("Starting generation...")
-    generate_web_logs(num=750000)
+    sys.exit(main())
@@ -6,6 +6,8 @@ def render_descriptive_statistics(filtered_df):
     st.header("Summary Statistics")
     request_counts = filtered_df["Request Type"].value_counts().reset_index()
     request_counts.columns = ["Request Type", "Count"]
+    # Categorical columns also count the categories filtered out entirely
+    request_counts = request_counts[request_counts["Count"] > 0]
     total_revenue = filtered_df["Revenue"].sum()
     revenue_non_zero_count = filtered_df[filtered_df["Revenue"] > 0]["Revenue"].count()
     avg_revenue = (
@@ -21,10 +21,10 @@ def render_dashboard(filtered_df, filters, df):
         render_sales_overview(filtered_df, filters)
 
     with tab2:
-        render_sales_performance(filtered_df, df)
+        render_sales_performance(filtered_df, filters, df)
 
     with tab3:
-        render_traffic_analytics(filtered_df)
+        render_traffic_analytics(filtered_df, filters)
 
     with tab4:
         render_descriptive_statistics(filtered_df)
@@ -44,65 +44,56 @@ def render_sales_overview(filtered_df, filters):
     month_filter = filters["month_filter"]
     start_date = filters["start_date"]
     end_date = filters["end_date"]
-    df = filters["df"]
 
     if month_filter == "All":
         latest_date = filtered_df["Timestamp"].max()
         current_year = latest_date.year
         prev_year = current_year - 1
-        ytd_cutoff = latest_date.replace(year=prev_year)
-        curr_df = filtered_df[
-            (filtered_df["Timestamp"] >= f"{current_year}-01-01")
-            & (filtered_df["Timestamp"] <= latest_date)
-        ]
-        prev_df = filtered_df[
-            (filtered_df["Timestamp"] >= f"{prev_year}-01-01")
-            & (filtered_df["Timestamp"] <= ytd_cutoff)
-        ]
+        # Whole days up to the latest one, inside the selected date range
+        latest_day = latest_date.normalize() + pd.Timedelta(days=1)
+        ytd_cutoff = latest_day.replace(year=prev_year)
+        curr = filters.period(
+            max(filters.start, pd.Timestamp(current_year, 1, 1)),
+            min(filters.end, latest_day),
+            filters.selection,
+        )
+        prev = filters.period(
+            max(filters.start, pd.Timestamp(prev_year, 1, 1)),
+            min(filters.end, ytd_cutoff),
+            filters.selection,
+        )
         period_label = "YTD vs Last Year"
     else:
         latest_year = filtered_df["year"].max()
         latest_month = filtered_df[filtered_df["year"] == latest_year]["month"].max()
         prev_month = 12 if latest_month == 1 else latest_month - 1
         prev_year = latest_year - 1 if latest_month == 1 else latest_year
-        curr_df = df[(df["month"] == latest_month) & (df["year"] == latest_year)]
-        prev_df = df[(df["month"] == prev_month) & (df["year"] == prev_year)]
+        curr = filters.period(selection={"month": latest_month, "year": latest_year})
+        prev = filters.period(selection={"month": prev_month, "year": prev_year})
         period_label = f"M-o-M {calendar.month_name[prev_month]}"
 
-    curr_sales = curr_df[curr_df["Request Type"] == "Product Purchase"].shape[0]
-    prev_sales = prev_df[prev_df["Request Type"] == "Product Purchase"].shape[0]
+    curr_sales = curr["total_sales"]
+    prev_sales = prev["total_sales"]
     sales_growth = (
         ((curr_sales - prev_sales) / prev_sales * 100) if prev_sales != 0 else 0
     )
 
-    curr_revenue = curr_df["Revenue"].sum()
-    prev_revenue = prev_df["Revenue"].sum()
+    curr_revenue = curr["total_sales_revenue"]
+    prev_revenue = prev["total_sales_revenue"]
     mom_revenue_growth = (
         ((curr_revenue - prev_revenue) / prev_revenue * 100) if prev_revenue != 0 else 0
     )
 
-    curr_conversion = (
-        curr_df[curr_df["Product"].notna()]["IP Address"].nunique()
-        / curr_df["IP Address"].nunique()
-        * 100
-        if curr_df["IP Address"].nunique() > 0
-        else 0
-    )
-    prev_conversion = (
-        prev_df[prev_df["Product"].notna()]["IP Address"].nunique()
-        / prev_df["IP Address"].nunique()
-        * 100
-        if prev_df["IP Address"].nunique() > 0
-        else 0
-    )
+    curr_conversion = curr["conversion_rate"]
+    prev_conversion = prev["conversion_rate"]
     conversion_growth = (
         ((curr_conversion - prev_conversion) / prev_conversion * 100)
         if prev_conversion != 0
         else 0
     )
 
-    curr_reach = curr_df["IP Address"].nunique()
-    prev_reach = prev_df["IP Address"].nunique()
+    curr_reach = curr["total_visitors"]
+    prev_reach = prev["total_visitors"]
     reach_growth = (
         ((curr_reach - prev_reach) / prev_reach * 100) if prev_reach != 0 else 0
     )
@@ -355,6 +346,7 @@ def render_sales_overview(filtered_df, filters):
             ]
             product_volume = product_volume_df["Product"].value_counts().reset_index()
             product_volume.columns = ["Product", "Volume"]
+            product_volume = product_volume[product_volume["Volume"] > 0]
             fig_product_volume = px.pie(
                 product_volume,
                 names="Product",
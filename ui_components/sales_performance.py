@@ -4,7 +4,7 @@ import plotly.graph_objects as go  # type: ignore
 import pandas as pd
 
 
-def render_sales_performance(filtered_df, df):
+def render_sales_performance(filtered_df, filters, df):
     sales_df = df.copy()
     sales_df["Timestamp"] = pd.to_datetime(sales_df["Timestamp"])
     sales_df["year"] = sales_df["Timestamp"].dt.year
@@ -58,27 +58,27 @@ def render_sales_performance(filtered_df, df):
     with filter3:
         selected_agent = st.radio(
             "View Performance for:",
-            options=time_sales_df["Sales Agent"].unique(),
+            options=list(time_sales_df["Sales Agent"].unique()),
             horizontal=True,
             key="tab4_agent",
         )
 
     tab4_df = time_sales_df[time_sales_df["Sales Agent"] == selected_agent]
+    if time_mode == "Monthly":
+        period_start = pd.Timestamp(int(selected_year), int(selected_month), 1)
+        period_end = period_start + pd.offsets.MonthBegin()
+    else:
+        quarter = pd.Period(selected_quarter, freq="Q")
+        period_start, period_end = quarter.start_time, (quarter + 1).start_time
+    period = filters.period(period_start, period_end, {"Sales Agent": selected_agent})
     sales_by_referrer = (
-        tab4_df.groupby("Referrer")["Revenue"].nunique()
+        tab4_df.groupby("Referrer", observed=True)["Revenue"].nunique()
         if not tab4_df.empty and "Referrer" in tab4_df.columns
         else pd.Series(dtype=float)
     )
-    product_funnel_df = (
-        tab4_df.groupby(["Product", "Request Type"])
-        .size()
-        .unstack(fill_value=0)
-        .reset_index()
-        if not tab4_df.empty
-        else pd.DataFrame(columns=["Product", "Demo Request", "Product Purchase"])
-    )
+    product_funnel_df = period["product_funnel"]
     expected_cols = ["Demo Request", "Product Purchase"]
-    available_cols = [col for col in expected_cols if col in product_funnel_df.columns]
+    available_cols = [col for col in expected_cols if product_funnel_df[col].any()]
     funnel_data = (
         product_funnel_df.melt(
             id_vars="Product",
@@ -97,11 +97,7 @@ def render_sales_performance(filtered_df, df):
         if "Request Type" in tab4_df
         else pd.DataFrame()
     )
-    sales_volume_by_country = (
-        product_purchases.groupby("Country").size().reset_index(name="Sales Made")
-        if not product_purchases.empty
-        else pd.DataFrame(columns=["Country", "Sales Made"])
-    )
+    sales_volume_by_country = period["sales_volume_by_country"]
 
     cont = st.container()
     col1, col2, col3 = cont.columns(3)
@@ -1,58 +1,34 @@
 import streamlit as st  # type: ignore
 import plotly.express as px  # type: ignore
-import pandas as pd
 
 
-def render_traffic_analytics(filtered_df):
-    ip_counts = filtered_df["IP Address"].value_counts()
-    filtered_df["visit_count"] = filtered_df["IP Address"].map(ip_counts)
-    filtered_df["visitor_type"] = filtered_df["visit_count"].apply(
-        lambda x: "New" if x == 1 else "Returning"
+def render_traffic_analytics(filtered_df, filters):
+    visitors_by_day = filters["visitors_by_day"]
+    new_visitors = filters["new_visitors"]
+    returning_visitors = filters["returning_visitors"]
+    avg_duration = filters["avg_session_duration"]
+
+    cont_traffic = st.container()
+    col1, col2, col3, col4 = cont_traffic.columns(4)
+    col1.metric(
+        "Total Visitors",
+        filters["total_visitors"],
+        help="Estimated unique visitors" if filters["approximate"] else None,
     )
-    day_map = {
-        0: "Monday",
-        1: "Tuesday",
-        2: "Wednesday",
-        3: "Thursday",
-        4: "Friday",
-        5: "Saturday",
-        6: "Sunday",
-    }
-    filtered_df["day_name"] = filtered_df["day_of_week"].map(day_map)
-    visitors_by_day = (
-        filtered_df.groupby("day_name")["IP Address"].nunique().reset_index()
+    exact = (
+        " Exact, even with approximate unique counts." if filters["approximate"] else ""
     )
-    visitors_by_day.columns = ["Day", "Visitors"]
-    day_order = [
-        "Monday",
-        "Tuesday",
-        "Wednesday",
-        "Thursday",
-        "Friday",
-        "Saturday",
-        "Sunday",
-    ]
-    visitors_by_day["Day"] = pd.Categorical(
-        visitors_by_day["Day"], categories=day_order, ordered=True
+    col2.metric(
+        "New Visitors",
+        new_visitors,
+        help="Visitors first seen inside the selected dates, month and year." + exact,
     )
-    visitors_by_day = visitors_by_day.sort_values("Day")
-
-    new_visitors = filtered_df[filtered_df["visitor_type"] == "New"][
-        "IP Address"
-    ].nunique()
-    returning_visitors = filtered_df[filtered_df["visitor_type"] == "Returning"][
-        "IP Address"
-    ].nunique()
-    session_duration = filtered_df.groupby("Session ID")["Timestamp"].agg(
-        lambda x: (x.max() - x.min()).seconds / 60
+    col3.metric(
+        "Returning Visitors",
+        returning_visitors,
+        help="Visitors in the selection who were first seen before the selected "
+        "dates, or in another month or year than the one selected." + exact,
     )
-    avg_duration = session_duration.mean()
-
-    cont_traffic = st.container()
-    col1, col2, col3, col4 = cont_traffic.columns(4)
-    col1.metric("Total Visitors", filtered_df["IP Address"].nunique())
-    col2.metric("New Visitors", new_visitors)
-    col3.metric("Returning Visitors", returning_visitors)
     col4.metric("Avg Session Duration", f"{avg_duration:.1f} mins")
 
     vis_cont = st.container()
@@ -81,10 +57,7 @@ def render_traffic_analytics(filtered_df):
             st.plotly_chart(fig_weekly, use_container_width=True)
 
         with cont_col2:
-            visitors_by_hour = (
-                filtered_df.groupby("hour")["IP Address"].nunique().reset_index()
-            )
-            visitors_by_hour.columns = ["hour", "visitors"]
+            visitors_by_hour = filters["visitors_by_hour"]
             fig_area = px.area(
                 visitors_by_hour,
                 x="hour",
@@ -102,14 +75,7 @@ def render_traffic_analytics(filtered_df):
             )
             st.plotly_chart(fig_area, use_container_width=True)
 
-        users_vs_new_users = (
-            filtered_df.groupby("month")
-            .agg(
-                total_visitors=("IP Address", "nunique"),
-                new_users=("visitor_type", lambda x: (x == "New").sum()),
-            )
-            .reset_index()
-        )
+        users_vs_new_users = filters["visitors_by_month"]
         fig_v_n = px.line(
             users_vs_new_users,
             x="month",
@@ -129,7 +95,7 @@ def render_traffic_analytics(filtered_df):
 
     with col2:
         traffic_by_referrer = (
-            filtered_df.groupby("Referrer")["IP Address"]
+            filtered_df.groupby("Referrer", observed=True)["IP Address"]
             .nunique()
             .reset_index()
             .rename(columns={"IP Address": "Visitors"})